@@ -0,0 +1,339 @@
+'''
+Benchmarks of the hot paths of google2pandas, on synthetic GA responses
+served by a local fake transport (see synthetic.py): no network and no
+credentials needed.
+
+Scenarios:
+    parse       QueryParser.parse
+    convert_v3  GoogleAnalyticsQuery.resp2frame, page by page
+    convert_v4  GoogleAnalyticsQueryV4.resp2frame, page by page
+    decode_*    raw response bodies to frames, page by page: json.loads
+                then resp2frame, or the column decoder (--decoder columns)
+    paginate_*  iter_pages: requests and JSON decoding, no conversion
+    e2e_*       execute_query with all_results: requests, decoding,
+                conversion and assembly of the frame
+
+For each scenario the best of --repeat runs is reported as rows/s (calls/s
+for parse), median and 95th percentile per-page latency (per call for
+parse, the whole run for e2e_*), and peak Python memory (a separate,
+traced run). Use --json to save the results and
+--compare to print the speed-up against results saved on another commit.
+--decoder sets the decoder of the query objects (and decode_*).
+
+    python benchmarks/bench_hot_paths.py [--rows 200000] [--pages 20] \\
+        [--dimensions 3] [--metrics 4] [--cardinality 5000] [--json out.json]
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import google2pandas._panalysis_ga as _panalysis_ga
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4, \
+    QueryParser, Scheduler
+from synthetic import FakeTransport, SyntheticReport
+
+
+def _unlimited():
+    # no rate limits nor quotas, only the code under test is measured
+    return Scheduler(qps=None, daily=None, view_daily=None,
+                     concurrency=64, view_concurrency=None)
+
+
+def v3_query(report):
+    return {
+        'ids' : 'ga:1',
+        'start_date' : '2024-01-01',
+        'end_date' : '2024-12-31',
+        'metrics' : [m for m, _ in report.metrics],
+        'dimensions' : report.dimensions,
+        'sort' : report.dimensions[:1] or [report.metrics[0][0]],
+        'filters' : 'ga:sessions>0',
+        'max_results' : report.page_size
+    }
+
+
+def v4_query(report):
+    return {'reportRequests' : [{
+        'viewId' : '1',
+        'dateRanges' : [{'startDate' : '2024-01-01', 'endDate' : '2024-12-31'}],
+        'dimensions' : [{'name' : f'ga:{d}'} for d in report.dimensions],
+        'metrics' : [{'expression' : f'ga:{m}'} for m, _ in report.metrics],
+        'pageSize' : report.page_size
+    }]}
+
+
+class Timer(object):
+    '''
+    Collects the time between successive ticks (one per page)
+    '''
+    def __init__(self):
+        self.laps = []
+        self._last = time.perf_counter()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.laps.append(now - self._last)
+        self._last = now
+
+
+def bench_parse(report, transport, args):
+    query = v3_query(report)
+    parser = QueryParser()
+
+    timer = Timer()
+    for _ in range(args.parse_calls):
+        parser.parse(**query)
+        timer.tick()
+
+    return args.parse_calls, timer
+
+
+def bench_convert_v3(report, transport, args):
+    pages = [json.loads(transport._v3_page(start + 1)) \
+        for start in range(0, report.rows, report.page_size)]
+
+    timer = Timer()
+    for page in pages:
+        GoogleAnalyticsQuery.resp2frame(page)
+        timer.tick()
+
+    return report.rows, timer
+
+
+def bench_convert_v4(report, transport, args):
+    pages = [{'reports' : [json.loads(transport._v4_report(str(start) if start else None))]} \
+        for start in range(0, report.rows, report.page_size)]
+
+    timer = Timer()
+    for page in pages:
+        GoogleAnalyticsQueryV4.resp2frame(page)
+        timer.tick()
+
+    return report.rows, timer
+
+
+def bench_decode_v3(report, transport, args):
+    bodies = [transport._v3_page(start + 1) \
+        for start in range(0, report.rows, report.page_size)]
+
+    timer = Timer()
+    for body in bodies:
+        if args.decoder == 'json':
+            body = json.loads(body)
+
+        GoogleAnalyticsQuery.resp2frame(body)
+        timer.tick()
+
+    return report.rows, timer
+
+
+def bench_decode_v4(report, transport, args):
+    bodies = [b'{"reports":[' + transport._v4_report(str(start) if start else None) + b']}' \
+        for start in range(0, report.rows, report.page_size)]
+
+    timer = Timer()
+    for body in bodies:
+        if args.decoder == 'json':
+            body = json.loads(body)
+
+        GoogleAnalyticsQueryV4.resp2frame(body)
+        timer.tick()
+
+    return report.rows, timer
+
+
+def bench_paginate_v3(report, transport, args):
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=_unlimited(),
+                                decoder=args.decoder)
+
+    timer = Timer()
+    for _ in conn.iter_pages(workers=args.workers, **v3_query(report)):
+        timer.tick()
+
+    return report.rows, timer
+
+
+def bench_paginate_v4(report, transport, args):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=_unlimited(),
+                                  decoder=args.decoder)
+
+    timer = Timer()
+    for _ in conn.iter_pages(v4_query(report)):
+        timer.tick()
+
+    return report.rows, timer
+
+
+def bench_e2e_v3(report, transport, args):
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=_unlimited(),
+                                decoder=args.decoder)
+
+    timer = Timer()
+    df, _ = conn.execute_query(all_results=True, workers=args.workers, **v3_query(report))
+    timer.tick()
+
+    assert len(df) == report.rows
+
+    return report.rows, timer
+
+
+def bench_e2e_v4(report, transport, args):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=_unlimited(),
+                                  decoder=args.decoder)
+
+    timer = Timer()
+    df = conn.execute_query(v4_query(report))
+    timer.tick()
+
+    assert len(df) == report.rows
+
+    return report.rows, timer
+
+
+scenarios = {
+    'parse'         : bench_parse,
+    'convert_v3'    : bench_convert_v3,
+    'convert_v4'    : bench_convert_v4,
+    'decode_v3'     : bench_decode_v3,
+    'decode_v4'     : bench_decode_v4,
+    'paginate_v3'   : bench_paginate_v3,
+    'paginate_v4'   : bench_paginate_v4,
+    'e2e_v3'        : bench_e2e_v3,
+    'e2e_v4'        : bench_e2e_v4
+}
+
+
+@contextlib.contextmanager
+def _quiet():
+    # the V3 client reports its progress on stdout (bound at import time)
+    sink = io.StringIO()
+    saved = _panalysis_ga.stdout
+    _panalysis_ga.stdout = sink
+
+    try:
+        with contextlib.redirect_stdout(sink):
+            yield
+
+    finally:
+        _panalysis_ga.stdout = saved
+
+
+def _percentile(values, q):
+    values = sorted(values)
+
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def run(name, report, transport, args):
+    fn = scenarios[name]
+    best = None
+
+    with _quiet():
+        for _ in range(args.repeat):
+            count, timer = fn(report, transport, args)
+            total = sum(timer.laps)
+
+            if best is None or total < best[1]:
+                best = (count, total, timer.laps)
+
+        tracemalloc.start()
+        fn(report, transport, args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    count, total, laps = best
+
+    return {
+        'rate' : count / total,
+        'seconds' : total,
+        'lap_median_ms' : 1000 * _percentile(laps, .5),
+        'lap_p95_ms' : 1000 * _percentile(laps, .95),
+        'peak_mib' : peak / 2**20
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                              capture_output=True, text=True).stdout.strip()
+
+    except OSError:
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--dimensions', type=int, default=3)
+    parser.add_argument('--metrics', type=int, default=4)
+    parser.add_argument('--cardinality', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.,
+                        help='simulated network latency per request, in seconds')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='concurrent page fetches of the V3 scenarios')
+    parser.add_argument('--decoder', default='json', choices=['json', 'columns'],
+                        help='decoder of the responses converted to frames')
+    parser.add_argument('--parse-calls', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', choices=list(scenarios),
+                        help='scenarios to run, all by default')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results (--json) of a previous run')
+    args = parser.parse_args()
+
+    report = SyntheticReport(rows=args.rows, dimensions=args.dimensions,
+                             metrics=args.metrics, cardinality=args.cardinality,
+                             pages=args.pages, seed=args.seed)
+    transport = FakeTransport(report, latency=args.latency).warm()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+
+    print(f'{"scenario":<12} {"rows/s":>12} {"page p50":>10} {"page p95":>10} '
+          f'{"peak MiB":>9}' + ('  vs baseline' if baseline else ''))
+
+    for name in args.only or scenarios:
+        res = results[name] = run(name, report, transport, args)
+
+        line = f'{name:<12} {res["rate"]:12,.0f} {res["lap_median_ms"]:8.2f}ms ' \
+               f'{res["lap_p95_ms"]:8.2f}ms {res["peak_mib"]:9.1f}'
+
+        if name in baseline:
+            line += f'  {res["rate"] / baseline[name]["rate"]:.2f}x'
+
+        print(line)
+
+    if args.json:
+        out = {
+            'commit' : _commit(),
+            'python' : platform.python_version(),
+            'shape' : {k : getattr(args, k) for k in ('rows', 'pages', 'dimensions',
+                'metrics', 'cardinality', 'seed', 'latency', 'workers', 'decoder')},
+            'results' : results
+        }
+
+        with open(args.json, 'w') as f:
+            json.dump(out, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
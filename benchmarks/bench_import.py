@@ -0,0 +1,82 @@
+'''
+Import time benchmark for google2pandas.
+
+Every scenario is timed in a fresh interpreter (best of --repeat runs). The
+run fails (non-zero exit status) if a scenario imports a module it should
+not, e.g. the google api client just to use the query parser, or if it is
+slower than --max-ms.
+
+    python benchmarks/bench_import.py [--repeat 5] [--max-ms 0]
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only needed once a service is built
+service_modules = ['googleapiclient', 'oauth2client', 'httplib2']
+
+# statement : modules it must not import
+scenarios = {
+    'import google2pandas'  : service_modules + ['pandas', 'numpy'],
+    'from google2pandas import QueryParser' : service_modules,
+    'from google2pandas import QueryCache'  : service_modules,
+    'from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4' : \
+        service_modules
+}
+
+child = '''
+import json, sys, time
+sys.path.insert(0, {root!r})
+
+t0 = time.perf_counter()
+{stmt}
+ms = 1000 * (time.perf_counter() - t0)
+
+loaded = [m for m in {forbidden!r} if m in sys.modules]
+print(json.dumps({{'ms' : ms, 'loaded' : loaded}}))
+'''
+
+
+def run(stmt, forbidden):
+    code = child.format(root=root, stmt=stmt, forbidden=forbidden)
+    out = subprocess.run([sys.executable, '-c', code], check=True,
+                         capture_output=True, text=True).stdout
+
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=0,
+                        help='fail if a scenario is slower than this, 0 disables the check')
+    args = parser.parse_args()
+
+    failed = False
+
+    for stmt, forbidden in scenarios.items():
+        results = [run(stmt, forbidden) for _ in range(args.repeat)]
+        best = min(r['ms'] for r in results)
+        loaded = results[0]['loaded']
+
+        status = 'ok'
+        if loaded:
+            status = f'FAIL (imported {", ".join(loaded)})'
+
+        elif args.max_ms and best > args.max_ms:
+            status = f'FAIL (over {args.max_ms:.0f} ms)'
+
+        failed |= status != 'ok'
+
+        print(f'{best:9.1f} ms  {status:<10}  {stmt}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+'''
+Deterministic synthetic GA responses, and a fake transport serving them.
+
+SyntheticReport describes the shape of a result (rows, dimensions,
+metrics, cardinality and number of pages) and builds its V3 pages
+(columnHeaders / rows / nextLink) and V4 report pages (columnHeader /
+data / nextPageToken). Page n is always the same for a given seed,
+whatever order the pages are requested in.
+
+FakeTransport answers the requests of GoogleAnalyticsQuery and
+GoogleAnalyticsQueryV4 (pass it as their 'transport') from a
+SyntheticReport, with pre-encoded pages so that the "server" costs next to
+nothing in the measurements.
+'''
+import datetime
+import json
+import math
+import random
+import time
+
+from urllib.parse import parse_qs, urlparse
+
+import httplib2
+
+dimension_names = ['date', 'pagePath', 'source', 'city', 'country', 'browser',
+                   'deviceCategory', 'landingPagePath', 'medium', 'campaign']
+
+metric_types = [('sessions', 'INTEGER'), ('pageviews', 'INTEGER'),
+                ('bounceRate', 'PERCENT'), ('avgSessionDuration', 'TIME'),
+                ('transactionRevenue', 'CURRENCY'), ('users', 'INTEGER'),
+                ('pageviewsPerSession', 'FLOAT'), ('goalCompletionsAll', 'INTEGER')]
+
+
+def _name(names, i):
+    # cycle through names, numbering the second round onwards
+    name = names[i % len(names)]
+
+    return name + str(i // len(names)) if i >= len(names) else name
+
+
+class SyntheticReport(object):
+    def __init__(self, rows=100000, dimensions=3, metrics=4, cardinality=5000,
+                 pages=10, seed=0):
+        '''
+        Parameters:
+        -----------
+            rows : int
+                Total number of rows of the result.
+            dimensions : int
+                Number of dimensions (the first one is 'date').
+            metrics : int
+                Number of metrics, cycling through the GA data types.
+            cardinality : int
+                Number of distinct values of each dimension ('date' is
+                capped at one value per day of a year).
+            pages : int
+                Number of pages the rows are split into.
+            seed : int
+        '''
+        self.rows = rows
+        self.cardinality = cardinality
+        self.pages = max(pages, 1)
+        self.page_size = max(math.ceil(rows / self.pages), 1)
+        self.seed = seed
+
+        self.dimensions = [_name(dimension_names, i) for i in range(dimensions)]
+        self.metrics = [(_name([m for m, _ in metric_types], i),
+                         metric_types[i % len(metric_types)][1]) for i in range(metrics)]
+
+        day = datetime.date(2024, 1, 1)
+        self._dates = [(day + datetime.timedelta(days=i)).strftime('%Y%m%d') \
+            for i in range(min(cardinality, 365))]
+
+    def page_rows(self, start):
+        '''
+        Rows start - start + page_size (0 based) as lists of strings,
+        dimensions first
+        '''
+        rnd = random.Random(self.seed * 1000003 + start)
+        stop = min(start + self.page_size, self.rows)
+
+        out = []
+        for _ in range(start, stop):
+            row = []
+            for name in self.dimensions:
+                if name == 'date':
+                    row.append(rnd.choice(self._dates))
+
+                else:
+                    row.append(f'/{name}/{rnd.randrange(self.cardinality)}')
+
+            for _, dtp in self.metrics:
+                if dtp == 'INTEGER':
+                    row.append(str(rnd.randrange(10000)))
+
+                else:
+                    row.append(repr(round(rnd.random() * 100, 4)))
+
+            out.append(row)
+
+        return out
+
+    def v3_page(self, start_index=1):
+        '''
+        V3 response for the page starting at start_index (1 based)
+        '''
+        start = start_index - 1
+        rows = self.page_rows(start)
+
+        page = {
+            'kind' : 'analytics#gaData',
+            'query' : {'start-index' : start_index, 'max-results' : self.page_size},
+            'itemsPerPage' : self.page_size,
+            'totalResults' : self.rows,
+            'containsSampledData' : False,
+            'columnHeaders' : \
+                [{'name' : f'ga:{d}', 'columnType' : 'DIMENSION', 'dataType' : 'STRING'} \
+                    for d in self.dimensions] + \
+                [{'name' : f'ga:{m}', 'columnType' : 'METRIC', 'dataType' : t} \
+                    for m, t in self.metrics],
+            'totalsForAllResults' : {f'ga:{m}' : '0' for m, _ in self.metrics}
+        }
+
+        if rows:
+            page['rows'] = rows
+
+        if start + self.page_size < self.rows:
+            page['nextLink'] = 'https://www.googleapis.com/analytics/v3/data/ga?' \
+                f'start-index={start_index + self.page_size}&max-results={self.page_size}'
+
+        return page
+
+    def v4_report(self, page_token=None):
+        '''
+        V4 report page starting at page_token (a row offset, as GA does)
+        '''
+        start = int(page_token or 0)
+        nd = len(self.dimensions)
+
+        report = {
+            'columnHeader' : {
+                'dimensions' : [f'ga:{d}' for d in self.dimensions],
+                'metricHeader' : {'metricHeaderEntries' : \
+                    [{'name' : f'ga:{m}', 'type' : t} for m, t in self.metrics]}
+            },
+            'data' : {
+                'rows' : [{'dimensions' : r[:nd], 'metrics' : [{'values' : r[nd:]}]} \
+                    for r in self.page_rows(start)],
+                'totals' : [{'values' : ['0'] * len(self.metrics)}],
+                'rowCount' : self.rows
+            }
+        }
+
+        if start + self.page_size < self.rows:
+            report['nextPageToken'] = str(start + self.page_size)
+
+        return report
+
+
+class FakeTransport(object):
+    '''
+    httplib2.Http like object answering V3 data.ga.get and V4 batchGet
+    requests from a SyntheticReport. Requests for other URLs get a 404.
+    '''
+    def __init__(self, report, latency=0.):
+        '''
+        Parameters:
+        -----------
+            report : SyntheticReport
+            latency : float
+                Seconds every request is delayed by (simulated network).
+        '''
+        self.report = report
+        self.latency = latency
+        self.requests = 0
+
+        self._v3 = {}
+        self._v4 = {}
+
+    def warm(self):
+        '''
+        Encode every page ahead of the measurements
+        '''
+        for start in range(0, self.report.rows, self.report.page_size):
+            self._v3_page(start + 1)
+            self._v4_report(str(start) if start else None)
+
+        return self
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.requests += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(uri)
+
+        if url.path.endswith('/data/ga'):
+            query = parse_qs(url.query)
+            content = self._v3_page(int(query.get('start-index', ['1'])[0]))
+
+        elif url.path.endswith('reports:batchGet'):
+            requests = json.loads(body)['reportRequests']
+            content = b'{"reports":[' + \
+                b','.join(self._v4_report(r.get('pageToken')) for r in requests) + b']}'
+
+        else:
+            return httplib2.Response({'status' : 404}), b''
+
+        return httplib2.Response({'status' : 200,
+                                  'content-type' : 'application/json'}), content
+
+    def close(self):
+        pass
+
+    def _v3_page(self, start_index):
+        if start_index not in self._v3:
+            self._v3[start_index] = json.dumps(self.report.v3_page(start_index)).encode()
+
+        return self._v3[start_index]
+
+    def _v4_report(self, page_token):
+        if page_token not in self._v4:
+            self._v4[page_token] = json.dumps(self.report.v4_report(page_token)).encode()
+
+        return self._v4[page_token]
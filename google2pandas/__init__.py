@@ -4,5 +4,43 @@ Created: 2015-11-16
 Keywords: google analytics, pandas
 '''
 
+import importlib
+
 # bring classes directly into package namespace
-from ._panalysis_ga import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4
\ No newline at end of file
+#
+# NOTE:
+# The classes are only imported on first access (PEP 562), so that
+# 'import google2pandas' stays cheap for tools that only need a part of
+# the package. The google api client, oauth2client and httplib2 are in
+# turn only imported once a query object builds its service.
+_lazy = {
+    'GoogleAnalyticsQuery'          : '._panalysis_ga',
+    'GoogleAnalyticsQueryV4'        : '._panalysis_ga',
+    'AsyncGoogleAnalyticsQueryV4'   : '._async_query',
+    'CredentialPool'                : '._pool',
+    'QueryCache'                    : '._cache',
+    'IncrementalStore'              : '._incremental',
+    'QueryParser'                   : '._query_parser',
+    'RecordingTransport'            : '._replay',
+    'ReplayTransport'               : '._replay',
+    'SpilledFrame'                  : '._spill',
+    'Scheduler'                     : '._scheduler',
+    'QuotaExhausted'                : '._scheduler'
+}
+
+__all__ = list(_lazy)
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    module = importlib.import_module(_lazy[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,298 @@
+import asyncio
+import os
+
+from contextlib import asynccontextmanager
+
+from ._dtypes import FrameBuilder, Interner
+from ._panalysis_ga import GoogleAnalyticsQueryV4, _batch_groups, \
+    default_scope, default_secrets_v4, max_report_requests, v4_report_fields
+from ._query_parser import QueryParser
+from ._scheduler import Scheduler, default_limits, retry_reasons, \
+    shared_scheduler
+
+default_endpoint = 'https://analyticsreporting.googleapis.com/v4/reports:batchGet'
+
+# seconds between attempts to take a place in the (thread based) concurrency
+# governor of the scheduler
+slot_poll = 0.01
+
+# Google APIs only compress responses for clients whose user agent contains
+# 'gzip' (the google api client does the same for the synchronous readers)
+default_headers = {
+    'Accept-Encoding'   : 'gzip',
+    'User-Agent'        : 'google2pandas (gzip)'
+}
+
+
+def _import_aiohttp():
+    '''
+    aiohttp is an optional dependency, only needed by the asyncio client.
+    '''
+    try:
+        import aiohttp
+
+    except ImportError:
+        raise ImportError('AsyncGoogleAnalyticsQueryV4 requires aiohttp '
+                          '(pip install aiohttp)')
+
+    return aiohttp
+
+
+class AsyncGoogleAnalyticsQueryV4(object):
+    def __init__(self,
+                 scope=default_scope,
+                 secrets=default_secrets_v4,
+                 endpoint=default_endpoint,
+                 concurrency=10,
+                 scheduler=None,
+                 strings='category',
+                 partial=True):
+        '''
+        asyncio counterpart of GoogleAnalyticsQueryV4: the same query bodies,
+        request packing, pagination and frame conversion, but every batchGet
+        call is an awaitable HTTP request, so a single event loop can keep
+        many report requests in flight. Requires aiohttp.
+
+        The object should be used as an async context manager (or closed with
+        'await conn.close()') so that its HTTP session is released.
+
+        Parameters:
+        -----------
+            scope : str
+                Designates the authentication scope
+            secrets : str
+                Path to the service account client_secrets.json file. None
+                sends no credentials, e.g. when talking to a local stub
+                server.
+            endpoint : str
+                URL of the batchGet method.
+            concurrency : int
+                Maximum number of batchGet calls in flight. Default = 10
+            scheduler : Scheduler
+                Rate limits, daily quotas and retries of the calls. By
+                default the one shared by every (synchronous or not) query
+                object using the same secrets.
+            strings : str
+                Storage of the string dimensions: 'category', 'pyarrow' or
+                'object'. Default = 'category'
+            partial : Boolean
+                Only request the parts of the responses the frames are built
+                from (not when dict objects are returned). Default = True
+        '''
+        self._aiohttp = _import_aiohttp()
+
+        self._endpoint = endpoint
+        self._strings = strings
+        self._partial = partial
+        self._credentials = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+
+        if scheduler is None:
+            scheduler = Scheduler(**default_limits['v4']) if secrets is None \
+                else shared_scheduler(os.path.abspath(secrets), 'v4')
+
+        self._scheduler = scheduler
+
+        if secrets is not None:
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            from ._credentials import shared_credentials
+
+            # same token as the synchronous clients using these secrets
+            self._credentials = shared_credentials(
+                (os.path.abspath(secrets), str(scope)),
+                lambda: ServiceAccountCredentials\
+                    .from_json_keyfile_name(secrets, scopes=scope))
+
+    async def execute_query(self, query, as_dict=False, all_results=True, fields=None):
+        '''
+        Execute query and translate it to a pandas.DataFrame object.
+        Refer to GoogleAnalyticsQueryV4.execute_query.
+        '''
+        fields = self._mask(fields, as_dict)
+
+        if not all_results:
+            out = await self._batch_get(query, fields)
+
+            if as_dict:
+                return out
+
+            return GoogleAnalyticsQueryV4.resp2frame(out, self._strings)
+
+        body = {k : v for k, v in query.items() if k != 'reportRequests'}
+        results = await self._collect(query['reportRequests'], as_dict, True, body, fields)
+
+        if as_dict:
+            return {'reports' : [r for res in results for r in res['reports']]}
+
+        return GoogleAnalyticsQueryV4._concat(results)
+
+    async def execute_many(self, requests, as_dict=False, all_results=True, fields=None):
+        '''
+        Execute an arbitrary number of report requests, packing compatible
+        ones into batchGet calls. The batches of every group are sent
+        concurrently. Refer to GoogleAnalyticsQueryV4.execute_many.
+        '''
+        return await self._collect(requests, as_dict, all_results, {},
+                                   self._mask(fields, as_dict))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _collect(self, requests, as_dict, all_results, body, fields=None):
+        '''
+        As GoogleAnalyticsQueryV4._collect: every page is converted as soon
+        as it arrives, the dimensions against one Interner shared by all
+        the requests
+        '''
+        interner = Interner()
+        pages = [[] for _ in requests]
+        builders = [FrameBuilder(self._strings, interner) for _ in requests]
+
+        await asyncio.gather(*(self._run_group(requests, pending,
+            pages if as_dict else builders, as_dict, all_results, body, fields) \
+                for pending in _batch_groups(requests)))
+
+        if as_dict:
+            return [{'reports' : p} for p in pages]
+
+        else:
+            return [b.frame() for b in builders]
+
+    async def _run_group(self, requests, pending, out, as_dict, all_results, body,
+                         fields=None):
+        '''
+        Fetch every page of a group of compatible requests. All batches of a
+        round are sent at once, the requests still needing pages are then
+        re-packed for the next round. Pages are added to out: lists of the
+        report pages if as_dict is set, else FrameBuilder objects.
+        '''
+        # work on copies so the callers requests are not left with
+        # page tokens in them
+        todo = {i : dict(requests[i]) for i in pending}
+
+        while pending:
+            batches = [pending[j:(j + max_report_requests)] \
+                for j in range(0, len(pending), max_report_requests)]
+            pending = []
+
+            responses = await asyncio.gather(*(self._batch_get(dict(body,
+                reportRequests=[todo[i] for i in batch]), fields) for batch in batches))
+
+            for batch, response in zip(batches, responses):
+                for i, report in zip(batch, response.get('reports', [])):
+                    tkn = report.get('nextPageToken', '')
+                    if tkn and all_results:
+                        todo[i]['pageToken'] = tkn
+                        pending.append(i)
+
+                    if as_dict:
+                        out[i].append(report)
+
+                    else:
+                        out[i].append(GoogleAnalyticsQueryV4._columns(report))
+                        report.pop('data', None)
+
+    def _mask(self, fields=None, as_dict=False):
+        # same selectors as GoogleAnalyticsQueryV4._mask
+        if fields is not None:
+            return QueryParser.check_fields(fields)
+
+        if self._partial and not as_dict:
+            return v4_report_fields
+
+        return None
+
+    async def _batch_get(self, body, fields=None):
+        if self._session is None:
+            self._session = self._aiohttp.ClientSession()
+
+        requests = body['reportRequests']
+        view, cost = requests[0].get('viewId'), len(requests)
+        scheduler = self._scheduler
+        params = {'fields' : fields} if fields else None
+        attempt = 0
+
+        while True:
+            await asyncio.sleep(scheduler.reserve(view, cost))
+            headers = dict(default_headers, **(await self._auth_headers()))
+            status, reason = None, None
+
+            try:
+                async with self._semaphore, self._slot(view):
+                    async with self._session.post(self._endpoint, json=body,
+                                                  params=params, headers=headers) as resp:
+                        if resp.status < 400:
+                            return await resp.json()
+
+                        status = resp.status
+                        reason = await self._error_reason(resp)
+
+                        if attempt >= scheduler.retries or \
+                                not scheduler.retryable(status, reason):
+                            resp.raise_for_status()
+
+            except self._aiohttp.ClientResponseError:
+                raise
+
+            # dropped connections, time outs...
+            except (self._aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= scheduler.retries:
+                    raise
+
+            delay = scheduler.backoff(attempt)
+            if status == 429 or reason in retry_reasons[:3]:
+                scheduler.throttle(view, delay)
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @asynccontextmanager
+    async def _slot(self, view=None):
+        '''
+        Hold a place in the concurrency governor of the scheduler, shared
+        with the synchronous clients, without blocking the event loop
+        '''
+        while not self._scheduler.acquire(view, blocking=False):
+            await asyncio.sleep(slot_poll)
+
+        try:
+            yield
+
+        finally:
+            self._scheduler.release(view)
+
+    @staticmethod
+    async def _error_reason(resp):
+        try:
+            error = (await resp.json(content_type=None))['error']
+
+        except Exception:
+            return None
+
+        errors = error.get('errors') or [{}]
+
+        return errors[0].get('reason') or error.get('status')
+
+    async def _auth_headers(self):
+        if self._credentials is None:
+            return {}
+
+        token = self._credentials.access_token
+
+        # the token is normally refreshed in the background before it
+        # expires; a refresh is a blocking call, keep it off the event loop
+        if token is None or self._credentials.expiring():
+            loop = asyncio.get_running_loop()
+            token = await loop.run_in_executor(None, self._credentials.token)
+
+        return {'Authorization' : f'Bearer {token}'}
@@ -0,0 +1,125 @@
+import pandas as pd
+import numpy as np
+
+import math
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# columns of the report of a bisection, one row per date range probed
+report_columns = ['start_date', 'end_date', 'depth', 'days', 'sampled',
+                  'samples_read', 'sampling_space', 'parts', 'seconds']
+
+
+def split_dates(start_date, end_date, parts=2):
+    '''
+    Split the (inclusive) date range start_date - end_date into at most
+    parts consecutive ranges of (nearly) the same number of days.
+
+    Returns:
+    -----------
+        ranges : list
+            (start_date, end_date) pairs formatted as YYYY-mm-dd.
+    '''
+    days = pd.date_range(start_date, end_date, freq='D')
+    chunks = np.array_split(np.arange(len(days)), min(parts, len(days)))
+
+    return [(days[c[0]].strftime('%Y-%m-%d'), days[c[-1]].strftime('%Y-%m-%d')) \
+        for c in chunks if len(c)]
+
+
+def sampling_parts(samples_read, sampling_space, days):
+    '''
+    Number of pieces to split a sampled range into: as many as it takes for
+    each to hold about as many sessions as were read, if the sampling rate
+    is known, else 2. Between 2 and days.
+    '''
+    parts = 2
+
+    if samples_read and sampling_space:
+        parts = math.ceil(sampling_space / samples_read)
+
+    return max(2, min(parts, days))
+
+
+def run_bisection(probe, fetch, start_date, end_date, workers=4):
+    '''
+    Fetch the date range start_date - end_date in as few unsampled pieces as
+    possible. Each range is first probed; a sampled one is split (see
+    sampling_parts) and its pieces probed in turn, down to single days,
+    which are fetched even if still sampled. Probes and fetches run
+    concurrently on a pool of workers.
+
+    Parameters:
+    -----------
+        probe : callable
+            probe(start_date, end_date) returns None if the data of the
+            range is not sampled, else a (samples read, sampling space)
+            pair, either of which may be None when unknown.
+        fetch : callable
+            fetch(start_date, end_date) returns the result of the range.
+        start_date, end_date : str
+            Absolute dates, formatted as YYYY-mm-dd.
+        workers : int
+            Maximum number of calls at the same time. Default = 4
+
+    Returns:
+    -----------
+        results : list
+            The result of each piece, in date order.
+        report : pandas.DataFrame
+            One row per range probed (see report_columns); 'parts' is the
+            number of pieces a sampled range was split into, 0 for the
+            ranges fetched.
+    '''
+    results, records = {}, []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def timed(fn, *args):
+            start = time.perf_counter()
+
+            return fn(*args), time.perf_counter() - start
+
+        def submit_probe(start, end, depth):
+            running[pool.submit(timed, probe, start, end)] = ('probe', start, end, depth)
+
+        submit_probe(start_date, end_date, 0)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                kind, start, end, depth = running.pop(future)
+                out, seconds = future.result()
+
+                if kind == 'fetch':
+                    results[start] = out
+                    continue
+
+                days = len(pd.date_range(start, end, freq='D'))
+                read, space = out if out is not None else (None, None)
+
+                parts = 0
+                if out is not None and days > 1:
+                    parts = sampling_parts(read, space, days)
+
+                    for piece in split_dates(start, end, parts):
+                        submit_probe(piece[0], piece[1], depth + 1)
+
+                else:
+                    if out is not None:
+                        print(f'Data for {start} is sampled, even for a single day')
+
+                    running[pool.submit(timed, fetch, start, end)] = \
+                        ('fetch', start, end, depth)
+
+                records.append((start, end, depth, days, out is not None,
+                                read, space, parts, seconds))
+
+    report = pd.DataFrame(records, columns=report_columns)
+    report = report.astype({'samples_read' : 'Int64', 'sampling_space' : 'Int64'})
+    report = report.sort_values(['start_date', 'depth'], ignore_index=True)
+
+    return [results[k] for k in sorted(results)], report
@@ -0,0 +1,220 @@
+import pandas as pd
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+default_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'google2pandas')
+
+# Arrow IPC files (frames, plus their metadata as JSON), or pickles, which
+# need no pyarrow but execute code when loaded: only for trusted directories
+cache_formats = ('arrow', 'pickle')
+
+_extensions = {'arrow' : 'arrow', 'pickle' : 'pkl'}
+
+# schema metadata key of the Arrow entries
+_meta_key = b'google2pandas'
+
+
+class QueryCache(object):
+    '''
+    Persistent on-disk cache for query results.
+
+    Entries are keyed by the canonical form of a query, i.e. after relative
+    dates have been resolved and prefixes applied, so re-issuing the same
+    historical query is served from disk instead of the API. Frames are
+    stored as Arrow IPC files (column buffers written out as is, dtypes
+    kept), which load in milliseconds; the metadata and dict results as
+    JSON in the same file.
+    '''
+    def __init__(self, path=default_cache_dir, ttl=86400, max_size=512 * 2**20,
+                 format='arrow'):
+        '''
+        Parameters:
+        -----------
+            path : str
+                Directory holding the cache entries; created if missing.
+            ttl : int or float
+                Time (in seconds) an entry stays valid for. None disables
+                expiry. Default = 1 day
+            max_size : int
+                Maximum total size (in bytes) of the cache. The least recently
+                used entries are evicted beyond this. Default = 512 MiB
+            format : str
+                'arrow' (requires pyarrow) or 'pickle'. Loading a pickle can
+                execute arbitrary code: only use 'pickle' for a directory no
+                one else can write to. Default = 'arrow'
+        '''
+        if format not in cache_formats:
+            raise ValueError(f'Invalid format \'{format}\', use one of '
+                             f'{", ".join(cache_formats)}')
+
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.format = format
+        self._lock = threading.Lock()
+
+        if format == 'arrow':
+            from ._sinks import _import_pyarrow
+
+            self._pa, _ = _import_pyarrow()
+
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(api, query, **options):
+        '''
+        Hash a canonical query (plus any options affecting the result) into
+        a cache key.
+        '''
+        blob = json.dumps([api, query, options], sort_keys=True, default=str)
+
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def cacheable(*end_dates):
+        '''
+        Only queries ending before today are cached, data for the current
+        day is still changing.
+        '''
+        today = pd.Timestamp('today').strftime('%Y-%m-%d')
+
+        return all(day < today for day in end_dates)
+
+    def get(self, key):
+        '''
+        Return the cached value for key, or None if missing or expired.
+        '''
+        fname = self._file(key)
+
+        try:
+            stat = os.stat(fname)
+
+            # mtime records when the entry was written, atime its last use
+            if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+                os.remove(fname)
+                return None
+
+            value = self._read(fname)
+
+            os.utime(fname, times=(time.time(), stat.st_mtime))
+
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+
+        return value
+
+    def set(self, key, value):
+        '''
+        Store value under key, evicting least recently used entries if the
+        cache grows beyond max_size.
+        '''
+        fname = self._file(key)
+        temp = f'{fname}.{threading.get_ident()}.tmp'
+
+        self._write(temp, value)
+
+        # atomic, so concurrent readers never see a partial entry
+        os.replace(temp, fname)
+
+        self._evict()
+
+    def clear(self):
+        '''
+        Remove every entry from the cache.
+        '''
+        with self._lock:
+            for fname in self._entries():
+                os.remove(fname)
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.{_extensions[self.format]}')
+
+    def _entries(self):
+        return [os.path.join(self.path, f) for f in os.listdir(self.path) \
+            if f.endswith(tuple(f'.{e}' for e in _extensions.values()))]
+
+    def _write(self, fname, value):
+        if self.format == 'pickle':
+            with open(fname, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+            return
+
+        # a frame, a (frame, metadata) pair (V3) or a dict (as_dict results)
+        frame, meta, kind = None, None, 'dict'
+
+        if isinstance(value, pd.DataFrame):
+            frame, kind = value, 'frame'
+
+        elif isinstance(value, tuple):
+            (frame, meta), kind = value, 'pair'
+
+        else:
+            meta = value
+
+        pa = self._pa
+        table = pa.Table.from_pandas(frame if frame is not None else pd.DataFrame(),
+                                     preserve_index=False)
+
+        blob = json.dumps({'kind' : kind, 'meta' : meta}).encode('utf-8')
+        metadata = dict(table.schema.metadata or {})
+        metadata[_meta_key] = blob
+
+        table = table.replace_schema_metadata(metadata)
+
+        with pa.OSFile(fname, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def _read(self, fname):
+        if self.format == 'pickle':
+            with open(fname, 'rb') as f:
+                return pickle.load(f)
+
+        pa = self._pa
+
+        try:
+            with pa.OSFile(fname, 'rb') as source:
+                table = pa.ipc.open_file(source).read_all()
+
+        except pa.ArrowException as e:
+            raise ValueError(f'Invalid cache entry {fname}: {e}')
+
+        entry = json.loads(table.schema.metadata[_meta_key])
+
+        if entry['kind'] == 'dict':
+            return entry['meta']
+
+        frame = table.to_pandas()
+
+        return frame if entry['kind'] == 'frame' else (frame, entry['meta'])
+
+    def _evict(self):
+        with self._lock:
+            stats = []
+            for fname in self._entries():
+                try:
+                    stats.append((os.stat(fname), fname))
+
+                except OSError:
+                    pass
+
+            total = sum(st.st_size for st, _ in stats)
+
+            # least recently used first
+            for st, fname in sorted(stats, key=lambda x: x[0].st_atime):
+                if total <= self.max_size:
+                    break
+
+                try:
+                    os.remove(fname)
+
+                except OSError:
+                    pass
+
+                total -= st.st_size
@@ -0,0 +1,150 @@
+import datetime
+import httplib2
+import threading
+
+# tokens are refreshed this many seconds before they expire
+default_refresh_margin = 300
+
+# credentials shared by every query object in the process, see
+# shared_credentials
+_shared = {}
+_shared_lock = threading.Lock()
+
+# one lock per key, held while its credentials are loaded: an interactive
+# authorization flow only blocks the threads waiting for the same key
+_loading = {}
+
+
+def _utcnow():
+    # oauth2client keeps token_expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class SharedCredentials(object):
+    '''
+    Wrapper around oauth2client credentials shared by several query objects
+    and threads.
+
+    The access token is refreshed in the background shortly before it
+    expires, so that long running pulls never wait on a refresh (or on a
+    401 response) halfway through. When a refresh is needed in the
+    foreground anyway, a single thread performs it while the others wait
+    and then use the new token.
+    '''
+    def __init__(self, credentials, margin=default_refresh_margin):
+        '''
+        Parameters:
+        -----------
+            credentials : oauth2client credentials
+            margin : int or float
+                Refresh the token this many seconds before it expires.
+                Default = 300
+        '''
+        self.credentials = credentials
+        self.margin = margin
+
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def token(self):
+        '''
+        Return a valid access token, refreshing it first if needed
+        '''
+        creds = self.credentials
+
+        if creds.access_token is None or self.expiring():
+            self.refresh(creds.access_token)
+
+        return creds.access_token
+
+    def refresh(self, stale_token=None):
+        '''
+        Refresh the access token, unless another thread already replaced
+        stale_token while this one was waiting.
+        '''
+        with self._lock:
+            creds = self.credentials
+
+            if creds.access_token == stale_token or self.expiring():
+                creds.refresh(httplib2.Http())
+                self._schedule()
+
+    def cancel(self):
+        '''
+        Stop refreshing the token in the background
+        '''
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    @property
+    def access_token(self):
+        return self.credentials.access_token
+
+    def expiring(self):
+        '''
+        True if the token expires within the refresh margin
+        '''
+        expiry = getattr(self.credentials, 'token_expiry', None)
+
+        if expiry is None:
+            return False
+
+        return (expiry - _utcnow()).total_seconds() < self.margin
+
+    def _schedule(self):
+        # called with the lock held
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        expiry = getattr(self.credentials, 'token_expiry', None)
+
+        if expiry is None:
+            return
+
+        delay = max((expiry - _utcnow()).total_seconds() - self.margin, 0)
+
+        self._timer = threading.Timer(delay, self._background_refresh,
+                                      args=(self.credentials.access_token,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self, stale_token):
+        try:
+            self.refresh(stale_token)
+
+        except Exception:
+            # the next request refreshes in the foreground and reports errors
+            pass
+
+
+def shared_credentials(key, factory, margin=default_refresh_margin):
+    '''
+    Return the process-wide SharedCredentials object for key (typically the
+    credentials file and scope). factory() is only called, to load the
+    credentials, the first time key is seen.
+    '''
+    with _shared_lock:
+        creds = _shared.get(key)
+
+        if creds is not None:
+            return creds
+
+        lock = _loading.setdefault(key, threading.Lock())
+
+    # factory() may run a (browser or console) authorization flow, keep the
+    # other keys available meanwhile
+    with lock:
+        with _shared_lock:
+            creds = _shared.get(key)
+
+        if creds is None:
+            creds = SharedCredentials(factory(), margin=margin)
+
+            with _shared_lock:
+                _shared[key] = creds
+                _loading.pop(key, None)
+
+        return creds
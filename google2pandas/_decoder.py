@@ -0,0 +1,311 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# How the responses of frame building calls are decoded: by the google api
+# client (json.loads, one Python object per row and value) or straight from
+# the raw body into column arrays.
+decoders = ('json', 'columns')
+
+# Columns are gathered into fixed width arrays (padded to their longest
+# value) while those take at most this many bytes. Wider dimensions, e.g. a
+# few very long page paths, are sliced one value at a time.
+fixed_width_budget = 32 * 2**20
+
+_rows_key = re.compile(rb'"rows"\s*:\s*\[')
+
+# +1 / -1 for the opening / closing brackets and braces, 0 otherwise
+_steps = np.zeros(256, dtype=np.int8)
+_steps[[ord('['), ord('{')]] = 1
+_steps[[ord(']'), ord('}')]] = -1
+
+
+def check_decoder(decoder):
+    if decoder not in decoders:
+        raise ValueError(f'Invalid decoder \'{decoder}\', use one of '
+                         f'{", ".join(decoders)}')
+
+    return decoder
+
+
+class DecodedRows(object):
+    '''
+    Stand-in for the 'rows' of a decoded page: the values of every column,
+    in header order. Dimensions are pandas.Categorical objects (only their
+    distinct values are decoded), metrics numpy bytes arrays, which
+    _dtypes.to_column casts as it does lists of strings.
+    '''
+    def __init__(self, columns, length):
+        self.columns = columns
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+
+class _Scanner(object):
+    '''
+    Locates the strings and the nesting of a JSON document with vectorized
+    operations over its bytes, without building any Python object.
+    '''
+    def __init__(self, content):
+        self.content = content
+        self.data = np.frombuffer(content, dtype=np.uint8)
+
+        quotes = np.flatnonzero(self.data == ord('"'))
+
+        # a quote preceded by an odd number of backslashes is escaped
+        escaped = []
+        for i in quotes[self.data[np.maximum(quotes - 1, 0)] == ord('\\')]:
+            j = i - 1
+            while j >= 0 and self.data[j] == ord('\\'):
+                j -= 1
+
+            if (i - j) % 2 == 0:
+                escaped.append(i)
+
+        if escaped:
+            quotes = np.setdiff1d(quotes, escaped)
+
+        self.valid = len(quotes) % 2 == 0
+        self.opening = quotes[0::2]
+        self.closing = quotes[1::2]
+
+        # brackets and braces outside of the strings, with the depth reached
+        steps = _steps[self.data]
+        marks = np.flatnonzero(steps)
+        marks = marks[np.searchsorted(quotes, marks) % 2 == 0]
+
+        self.marks = marks
+        self.steps = steps[marks]
+        self.depth = np.cumsum(self.steps)
+
+    def rows_spans(self):
+        '''
+        (start, end) byte offsets of the opening and closing brackets of
+        every 'rows' array, in document order
+        '''
+        pos = 0
+
+        while True:
+            match = _rows_key.search(self.content, pos)
+
+            if match is None:
+                return
+
+            # the key must start a string (and not be part of one)
+            k = np.searchsorted(self.opening, match.start())
+            if k == len(self.opening) or self.opening[k] != match.start():
+                pos = match.end()
+                continue
+
+            start = match.end() - 1
+            i = np.searchsorted(self.marks, start)
+            rel = self.depth[i:] - (self.depth[i] - 1)
+            end = np.argmax(rel == 0)
+
+            if rel[end] != 0:
+                raise ValueError('Unterminated rows array')
+
+            yield start, self.marks[i + end]
+
+            pos = self.marks[i + end]
+
+    def strings(self, start, end):
+        '''
+        Offsets of the contents of the strings between start and end
+        '''
+        i, j = np.searchsorted(self.opening, [start, end])
+
+        return self.opening[i:j] + 1, self.closing[i:j]
+
+    def count(self, start, end, char):
+        i, j = np.searchsorted(self.marks, [start, end + 1])
+
+        return int((self.data[self.marks[i:j]] == ord(char)).sum())
+
+    def values(self, starts, stops):
+        '''
+        The strings at starts - stops, as a fixed width bytes array, or None
+        if it would take more than fixed_width_budget bytes
+        '''
+        lengths = stops - starts
+        width = max(int(lengths.max()) if len(lengths) else 0, 1)
+
+        if len(starts) * width > fixed_width_budget:
+            return None
+
+        # one byte position at a time, over the values long enough
+        out = np.zeros((len(starts), width), dtype=np.uint8)
+        for k in range(width):
+            live = lengths > k
+            out[live, k] = self.data[starts[live] + k]
+
+        return out.view(f'S{width}').ravel()
+
+    def column(self, starts, stops, dimension):
+        '''
+        A dimension as a pandas.Categorical object, a metric as a bytes
+        array; None if a metric is too wide for a fixed width array
+        '''
+        values = self.values(starts, stops)
+
+        if not dimension:
+            return values
+
+        if values is None:
+            values = np.empty(len(starts), dtype=object)
+            values[:] = [self.content[i:j] for i, j in zip(starts.tolist(), stops.tolist())]
+
+        codes, uniques = pd.factorize(values)
+
+        return pd.Categorical.from_codes(codes.astype(np.int32),
+                                         [_unescape(u) for u in uniques])
+
+
+def _unescape(value):
+    if b'\\' in value:
+        return json.loads(b'"' + value + b'"')
+
+    return value.decode('utf-8')
+
+
+def _split(content):
+    '''
+    Scan content and parse everything but its 'rows' arrays, which are
+    left empty. Returns (scanner, document, spans).
+    '''
+    scanner = _Scanner(content)
+
+    if not scanner.valid:
+        return None, None, None
+
+    try:
+        spans = list(scanner.rows_spans())
+
+        parts, pos = [], 0
+        for start, end in spans:
+            parts.extend([content[pos:start], b'[]'])
+            pos = end + 1
+
+        parts.append(content[pos:])
+
+        return scanner, json.loads(b''.join(parts)), spans
+
+    except ValueError:
+        return None, None, None
+
+
+def decode_v3(content):
+    '''
+    Decode a V3 (data.ga.get) response with its rows as a DecodedRows
+    object. Returns None if the rows do not have the expected layout (a
+    list of lists of one string per column header).
+    '''
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    scanner, doc, spans = _split(content)
+
+    if scanner is None or len(spans) != 1 or 'columnHeaders' not in doc:
+        return None
+
+    start, end = spans[0]
+    hdrs = doc['columnHeaders']
+    starts, stops = scanner.strings(start, end)
+
+    nrows = scanner.count(start, end, '[') - 1
+    if scanner.count(start, end, '{') or len(starts) != nrows * len(hdrs):
+        return None
+
+    columns = [scanner.column(starts[j::len(hdrs)], stops[j::len(hdrs)],
+                              h.get('columnType') == 'DIMENSION') \
+        for j, h in enumerate(hdrs)]
+
+    if any(c is None for c in columns):
+        return None
+
+    doc['rows'] = DecodedRows(columns, nrows)
+
+    return doc
+
+
+def decode_v4(content):
+    '''
+    Decode a V4 (reports.batchGet) response with the rows of each report
+    as a DecodedRows object. Returns None if the rows do not have the
+    expected layout: dimensions, then the metrics of a single date range
+    and no pivots.
+    '''
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    scanner, doc, spans = _split(content)
+
+    if scanner is None:
+        return None
+
+    data = [r.get('data', {}) for r in doc.get('reports', [])]
+    data = [(r, d) for r, d in zip(doc.get('reports', []), data) if 'rows' in d]
+
+    if len(data) != len(spans):
+        return None
+
+    for (report, d), (start, end) in zip(data, spans):
+        hdrs = report.get('columnHeader', {})
+        ndims = len(hdrs.get('dimensions', []))
+        nmets = len(hdrs.get('metricHeader', {}).get('metricHeaderEntries', []))
+
+        # keys and values of a row, in order:
+        #   dimensions, <ndims values>, metrics, values, <nmets values>
+        keys = [b'dimensions'] + [None] * ndims if ndims else []
+        keys = keys + [b'metrics', b'values'] + [None] * nmets
+
+        starts, stops = scanner.strings(start, end)
+        nrows = scanner.count(start, end, '{') // 2
+
+        if len(starts) != nrows * len(keys) or \
+                scanner.count(start, end, '{') != 2 * nrows or \
+                scanner.count(start, end, '[') != 1 + nrows * (2 + bool(ndims)):
+            return None
+
+        for j, key in enumerate(keys):
+            if key is None or not nrows:
+                continue
+
+            # compared a byte position at a time, whatever the budget
+            key_starts = starts[j::len(keys)]
+
+            if (stops[j::len(keys)] - key_starts != len(key)).any() or \
+                    any((scanner.data[key_starts + k] != c).any() for k, c in enumerate(key)):
+                return None
+
+        columns = [scanner.column(starts[j::len(keys)], stops[j::len(keys)],
+                                  j <= ndims) \
+            for j, key in enumerate(keys) if key is None]
+
+        if any(c is None for c in columns):
+            return None
+
+        d['rows'] = DecodedRows(columns, nrows)
+
+    return doc
+
+
+def columns_postproc(postproc, decode):
+    '''
+    Wrap the postproc of a google api request to decode its response with
+    decode (decode_v3 or decode_v4), falling back to postproc
+    '''
+    def _postproc(resp, content):
+        if resp.status == 200:
+            doc = decode(content)
+
+            if doc is not None:
+                return doc
+
+        return postproc(resp, content)
+
+    return _postproc
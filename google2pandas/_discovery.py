@@ -0,0 +1,139 @@
+import httplib2
+import json
+import os
+import threading
+import time
+
+from googleapiclient.discovery import build_from_document
+
+from ._cache import default_cache_dir
+from ._transport import is_shared
+
+default_discovery_dir = os.path.join(default_cache_dir, 'discovery')
+default_discovery_v3 = 'https://www.googleapis.com/discovery/v1/apis/{api}/{apiVersion}/rest'
+
+# documents on disk are re-fetched (when possible) after this many seconds
+default_max_age = 7 * 86400
+
+# parsed documents, and services built on the process-wide transports,
+# memoized for the whole process
+_documents = {}
+_services = {}
+_lock = threading.Lock()
+
+
+def discovery_document(api, version, discovery_url=None,
+                       path=default_discovery_dir, max_age=default_max_age):
+    '''
+    Return the parsed discovery document of api / version, without going to
+    the network whenever possible. Looked up, in order:
+
+        1. documents already loaded by this process
+        2. the on-disk cache, if younger than max_age
+        3. the documents shipped with google-api-python-client
+        4. discovery_url, the result of which is written to the disk cache
+        5. the on-disk cache, however old
+    '''
+    key = (api, version)
+
+    with _lock:
+        if key in _documents:
+            return _documents[key]
+
+    fname = os.path.join(path, f'{api}.{version}.json')
+    doc = _read(fname, max_age) or _static(api, version)
+
+    if doc is None and discovery_url is not None:
+        doc = _fetch(api, version, discovery_url)
+
+        if doc is not None:
+            _write(fname, doc)
+
+    doc = doc or _read(fname, None)
+
+    if doc is None:
+        raise ValueError(f'No discovery document available for {api} {version}')
+
+    with _lock:
+        return _documents.setdefault(key, doc)
+
+
+def build_service(api, version, http, discovery_url=None):
+    '''
+    Build the google api service object for api / version from its
+    discovery document. Services on a process-wide transport (see
+    _transport.shared_transport) are built once; those on any other
+    transport are not kept, so that the transport can be released with the
+    query objects using it.
+    '''
+    if not is_shared(http):
+        doc = discovery_document(api, version, discovery_url)
+
+        return build_from_document(doc, http=http)
+
+    key = (api, version, http)
+
+    with _lock:
+        service = _services.get(key)
+
+    if service is None:
+        doc = discovery_document(api, version, discovery_url)
+        service = build_from_document(doc, http=http)
+
+        with _lock:
+            service = _services.setdefault(key, service)
+
+    return service
+
+
+def _read(fname, max_age):
+    try:
+        if max_age is not None and time.time() - os.stat(fname).st_mtime > max_age:
+            return None
+
+        with open(fname, 'r') as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return None
+
+
+def _write(fname, doc):
+    try:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+
+        temp = f'{fname}.{threading.get_ident()}.tmp'
+        with open(temp, 'w') as f:
+            json.dump(doc, f)
+
+        os.replace(temp, fname)
+
+    except OSError:
+        pass
+
+
+def _static(api, version):
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+
+    except ImportError:
+        return None
+
+    doc = get_static_doc(api, version)
+
+    return json.loads(doc) if doc else None
+
+
+def _fetch(api, version, discovery_url):
+    uri = discovery_url.replace('{api}', api).replace('{apiVersion}', version)
+
+    try:
+        resp, content = httplib2.Http().request(uri)
+
+    except (httplib2.HttpLib2Error, OSError):
+        return None
+
+    if resp.status >= 400:
+        return None
+
+    return json.loads(content)
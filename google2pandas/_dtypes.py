@@ -0,0 +1,321 @@
+import pandas as pd
+import numpy as np
+
+import threading
+
+# GA data type to (nullable) pandas dtype
+ga_dtypes = {
+    'INTEGER'   : 'Int64',
+    'FLOAT'     : 'Float64',
+    'CURRENCY'  : 'Float64',
+    'PERCENT'   : 'Float64',
+    'TIME'      : 'Float64',
+    'BOOLEAN'   : 'boolean'
+}
+
+# Dimensions holding dates, parsed with the given format
+date_dimensions = {
+    'date'              : '%Y%m%d',
+    'dateHour'          : '%Y%m%d%H',
+    'dateHourMinute'    : '%Y%m%d%H%M'
+}
+
+# Dimensions holding (small) integers
+int_dimensions = {
+    'hour'              : 'Int8',
+    'minute'            : 'Int8',
+    'day'               : 'Int8',
+    'dayOfWeek'         : 'Int8',
+    'week'              : 'Int8',
+    'isoWeek'           : 'Int8',
+    'month'             : 'Int8',
+    'year'              : 'Int16',
+    'isoYear'           : 'Int16',
+    'yearMonth'         : 'Int32',
+    'yearWeek'          : 'Int32',
+    'isoYearIsoWeek'    : 'Int32',
+    'nthMinute'         : 'Int32',
+    'nthHour'           : 'Int32',
+    'nthDay'            : 'Int32',
+    'nthWeek'           : 'Int32',
+    'nthMonth'          : 'Int32'
+}
+
+# How the other (string) dimensions are stored
+string_dtypes = ('category', 'pyarrow', 'object')
+
+
+def string_dtype(strings='category'):
+    '''
+    pandas dtype of the string dimensions for the given option
+    '''
+    if strings not in string_dtypes:
+        raise ValueError(f'Invalid strings option \'{strings}\', use one of '
+                         f'{", ".join(string_dtypes)}')
+
+    if strings == 'pyarrow':
+        try:
+            return pd.StringDtype('pyarrow')
+
+        except ImportError:
+            raise ImportError('strings=\'pyarrow\' requires pyarrow '
+                              '(pip install pyarrow)')
+
+    return strings
+
+
+def column_dtype(name, ga_type, dimension=False, strings='category'):
+    '''
+    pandas dtype of a GA column, from its name (without prefix) and data
+    type. Dates are returned as 'datetime64[ns]'.
+    '''
+    if dimension:
+        if name in date_dimensions:
+            return 'datetime64[ns]'
+
+        if name in int_dimensions:
+            return int_dimensions[name]
+
+    if ga_type in ga_dtypes:
+        return ga_dtypes[ga_type]
+
+    return string_dtype(strings)
+
+
+def to_column(values, name, ga_type, dimension=False, strings='category'):
+    '''
+    Cast a sequence of GA (string) values to a compact pandas array in one
+    step. Values that can not be parsed, e.g. the '(other)' row of a date
+    dimension, become missing values.
+
+    Parameters:
+    -----------
+        values : sequence of str
+        name : str
+            Column name, without the 'ga:' prefix.
+        ga_type : str
+            GA data type (INTEGER, FLOAT, CURRENCY, PERCENT, TIME, BOOLEAN or
+            STRING).
+        dimension : Boolean
+            Whether the column is a dimension. Default = False
+        strings : str
+            Storage of the string columns: 'category', 'pyarrow' (Arrow
+            backed strings) or 'object'. Default = 'category'
+    '''
+    dtp = column_dtype(name, ga_type, dimension, strings)
+
+    if isinstance(values, pd.Categorical) and dtp != 'category':
+        # e.g. a dimension of a decoded page: only the distinct values are
+        # cast
+        cats = np.asarray(values.categories, dtype=object)
+
+        return to_column(cats, name, ga_type, dimension, strings).take(values.codes)
+
+    if dtp == 'datetime64[ns]':
+        return pd.to_datetime(np.array(values, dtype=object),
+                              format=date_dimensions[name],
+                              errors='coerce').astype(dtp).array
+
+    if dtp == 'boolean':
+        return pd.array(np.array(values, dtype=str) == 'true', dtype=dtp)
+
+    if dtp in ('Int8', 'Int16', 'Int32', 'Int64', 'Float64'):
+        return _to_numeric(values, dtp)
+
+    if dtp == 'category':
+        return pd.Categorical(values)
+
+    return pd.array(np.array(values, dtype=object), dtype=dtp)
+
+
+def _to_numeric(values, dtp):
+    # bytes arrays (decoded pages) are parsed as they are
+    arr = np.asarray(values)
+    if arr.dtype.kind not in 'SU':
+        arr = arr.astype(str)
+
+    try:
+        # the common case, every value is a number
+        return pd.array(arr.astype(dtp.lower()), dtype=dtp)
+
+    except ValueError:
+        return pd.array(pd.to_numeric(arr.astype(str), errors='coerce'), dtype=dtp)
+
+
+class Interner(object):
+    '''
+    Dictionaries of the string dimension values, one per column, shared by
+    every page (and shard) of a result.
+
+    Each page is factorized once and only its distinct values are looked
+    up, so the pages are reduced to integer codes as they arrive. Codes are
+    only ever appended: the categories of a frame built early are a prefix
+    of those of any frame built later, which lets concat_frames combine
+    them from their codes alone.
+    '''
+    def __init__(self):
+        self._lookup = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def encode(self, column, values):
+        '''
+        Return the codes (numpy.int32 array) of values in the dictionary of
+        column, adding the values not seen yet
+        '''
+        if isinstance(values, pd.Categorical):
+            codes, uniques = values.codes, values.categories
+
+        else:
+            codes, uniques = pd.factorize(np.array(values, dtype=object))
+
+        mapping = np.empty(len(uniques), dtype=np.int32)
+
+        with self._lock:
+            lookup = self._lookup.setdefault(column, {})
+            known = self._values.setdefault(column, [])
+
+            for j, value in enumerate(uniques):
+                code = lookup.get(value)
+
+                if code is None:
+                    code = lookup[value] = len(known)
+                    known.append(value)
+
+                mapping[j] = code
+
+        return mapping[codes]
+
+    def categories(self, column):
+        '''
+        Current dictionary of column, as a CategoricalDtype
+        '''
+        with self._lock:
+            values = list(self._values.get(column, []))
+
+        return pd.CategoricalDtype(values)
+
+
+class FrameBuilder(object):
+    '''
+    Assemble a single pandas.DataFrame from the pages of a result.
+
+    Every page is cast as it is appended. Categorical columns are kept as
+    integer codes against the dictionaries of the interner; the final frame
+    is built from the concatenated codes, without hashing the values again.
+    '''
+    def __init__(self, strings='category', interner=None):
+        '''
+        Parameters:
+        -----------
+            strings : str
+                Storage of the string dimensions, see to_column.
+                Default = 'category'
+            interner : Interner
+                Dictionaries to encode categorical columns with; share one
+                between builders whose frames are combined later (e.g. date
+                shards). Default = a new Interner
+        '''
+        self.strings = strings
+        self.interner = interner if interner is not None else Interner()
+
+        self._names = None
+        self._parts = {}
+        self._categorical = set()
+
+        # size of the pages appended (the object columns count their
+        # references only)
+        self.nbytes = 0
+        self.rows = 0
+
+    def append(self, columns):
+        '''
+        Add a page, given as a sequence of (name, values, GA data type,
+        is dimension) tuples.
+        '''
+        if self._names is None:
+            self._names = [c[0] for c in columns]
+
+        for name, values, ga_type, dimension in columns:
+            if column_dtype(name, ga_type, dimension, self.strings) == 'category':
+                self._categorical.add(name)
+                part = self.interner.encode(name, values)
+
+            else:
+                part = to_column(values, name, ga_type, dimension, self.strings)
+
+            self._parts.setdefault(name, []).append(part)
+            self.nbytes += part.nbytes
+
+        if columns:
+            self.rows += len(part)
+
+    def frame(self):
+        '''
+        The pandas.DataFrame of every page appended so far
+        '''
+        if self._names is None:
+            return pd.DataFrame()
+
+        data = {}
+        for name in self._names:
+            parts = self._parts[name]
+
+            if name in self._categorical:
+                data[name] = pd.Categorical.from_codes(np.concatenate(parts),
+                    dtype=self.interner.categories(name))
+
+            elif len(parts) == 1:
+                data[name] = parts[0]
+
+            else:
+                data[name] = pd.concat([pd.Series(p, copy=False) for p in parts],
+                                       ignore_index=True)
+
+        return pd.DataFrame(data, columns=self._names)
+
+
+def concat_frames(frames):
+    '''
+    Concatenate frames with the same columns (e.g. the pages of one result)
+    column by column. pd.concat would turn categoricals with different
+    categories into object columns: those built from one Interner (whose
+    categories are prefixes of each other) are combined from their codes,
+    other ones are unioned.
+    '''
+    frames = [df for df in frames if len(df.columns)]
+
+    if not frames:
+        return pd.DataFrame()
+
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = list(frames[0].columns)
+
+    if any(list(df.columns) != columns for df in frames[1:]):
+        return pd.concat(frames, ignore_index=True)
+
+    data = {}
+    for c in columns:
+        parts = [df[c] for df in frames]
+
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            data[c] = _concat_categoricals(parts)
+
+        else:
+            data[c] = pd.concat(parts, ignore_index=True)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+def _concat_categoricals(parts):
+    cats = [p.cat.categories for p in parts]
+    longest = max(cats, key=len)
+
+    if all(longest[:len(c)].equals(c) for c in cats):
+        codes = np.concatenate([p.cat.codes.to_numpy() for p in parts])
+
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(longest))
+
+    return pd.api.types.union_categoricals(parts)
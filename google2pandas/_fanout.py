@@ -0,0 +1,87 @@
+import pandas as pd
+import numpy as np
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+# column added to the result of every view
+view_column = 'view_id'
+
+
+def fanout_tasks(views):
+    '''
+    Normalize the views of a fan-out to (view, dates) pairs, dates being
+    None (keep those of the query template) or a (start_date, end_date)
+    pair.
+
+    Parameters:
+    -----------
+        views : iterable
+            View ids, (view, (start_date, end_date)) pairs or
+            (view, start_date, end_date) triples.
+    '''
+    tasks = []
+
+    for item in views:
+        if isinstance(item, (tuple, list)):
+            view, dates = item[0], tuple(item[1:])
+
+            if len(dates) == 1:
+                dates = tuple(dates[0])
+
+            if len(dates) != 2:
+                raise ValueError(f'Invalid date range for view {view}: {dates}')
+
+            tasks.append((str(view), dates))
+
+        else:
+            tasks.append((str(item), None))
+
+    return tasks
+
+
+def run_fanout(fetch, tasks, workers=8):
+    '''
+    Call fetch(view, dates) for every task on a pool of workers, yielding
+    (view, result, error) triples in completion order. Exceptions raised
+    for a view are yielded as its error (result is then None), they do not
+    stop the other views. At most twice as many tasks as there are workers
+    are started ahead of the consumer.
+    '''
+    tasks = iter(tasks)
+    window = 2 * workers
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def submit(n):
+            for view, dates in islice(tasks, n):
+                running[pool.submit(fetch, view, dates)] = view
+
+        submit(window)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                view = running.pop(future)
+                error = future.exception()
+
+                if error is None:
+                    yield view, future.result(), None
+
+                else:
+                    yield view, None, error
+
+            submit(window - len(running))
+
+
+def tag_view(df, view):
+    '''
+    Add the (categorical) view_id column in front of the result of a view
+    '''
+    codes = np.zeros(len(df), dtype=np.int8)
+
+    df.insert(0, view_column, pd.Categorical.from_codes(codes, categories=[view]))
+
+    return df
@@ -0,0 +1,192 @@
+import pandas as pd
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+from ._cache import default_cache_dir
+from ._dtypes import concat_frames
+
+default_incremental_dir = os.path.join(default_cache_dir, 'incremental')
+
+# days before the watermark fetched again, GA keeps processing (and
+# restating) the data of the last day or two
+default_restate = 2
+
+
+class IncrementalStore(object):
+    '''
+    On-disk store of the results of incremental queries (see the
+    execute_incremental methods).
+
+    Entries are keyed by the canonical query without its dates, so the
+    result of a rolling window (e.g. the last 90 days) is found again on
+    every run, together with the date range it covers. Unlike QueryCache,
+    entries never expire nor are evicted.
+    '''
+    def __init__(self, path=default_incremental_dir):
+        '''
+        Parameters:
+        -----------
+            path : str
+                Directory holding the stored results; created if missing.
+        '''
+        self.path = path
+
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(api, query):
+        '''
+        Hash a canonical query, stripped of its dates, into a store key.
+        '''
+        blob = json.dumps([api, query], sort_keys=True, default=str)
+
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def load(self, key):
+        '''
+        Return the stored pandas.DataFrame for key, or None.
+        '''
+        return self.load_entry(key)[0]
+
+    def load_entry(self, key):
+        '''
+        Return the stored pandas.DataFrame for key and the (start_date,
+        end_date) range it covers; (None, None) if there is none. The range
+        is None for entries saved without it.
+        '''
+        try:
+            with open(self._file(key), 'rb') as f:
+                entry = pickle.load(f)
+
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None, None
+
+        if isinstance(entry, dict):
+            return entry['frame'], entry['covered']
+
+        return entry, None
+
+    def save(self, key, df, covered=None):
+        '''
+        Store df under key, with the (start_date, end_date) range it covers,
+        replacing the previous result.
+        '''
+        fname = self._file(key)
+        temp = f'{fname}.{threading.get_ident()}.tmp'
+
+        entry = {'frame' : df, 'covered' : tuple(covered) if covered else None}
+
+        with open(temp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # atomic, so concurrent readers never see a partial entry
+        os.replace(temp, fname)
+
+    def remove(self, key):
+        '''
+        Forget the stored result for key, the next run fetches everything.
+        '''
+        try:
+            os.remove(self._file(key))
+
+        except OSError:
+            pass
+
+    def _file(self, key):
+        return os.path.join(self.path, f'{key}.pkl')
+
+
+def _dates(col):
+    '''
+    The 'date' column as datetime64 values; results stored before the
+    columns were typed from their GA data type hold YYYYmmdd strings
+    '''
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+
+    return pd.to_datetime(col.astype(str), format='%Y%m%d')
+
+
+def watermark(df):
+    '''
+    High-water date (YYYY-mm-dd) of a stored result, or None.
+    '''
+    if df is None or 'date' not in df.columns or not len(df):
+        return None
+
+    return _dates(df['date']).max().strftime('%Y-%m-%d')
+
+
+def fetch_start(start_date, end_date, mark, restate=default_restate):
+    '''
+    First day to fetch for the window start_date - end_date, given the
+    high-water date of the stored result: the day after it, less restate
+    days. Returns None if nothing needs fetching.
+    '''
+    if mark is None or mark < start_date:
+        return start_date
+
+    start = pd.Timestamp(mark) + pd.Timedelta(days=1 - restate)
+    start = max(start.strftime('%Y-%m-%d'), start_date)
+
+    return start if start <= end_date else None
+
+
+def backfill_range(start_date, end_date, covered_start, fetched_from):
+    '''
+    Days of the window start_date - end_date before covered_start, the
+    first day covered by the stored result, when the window was moved
+    back. Stops short of fetched_from (see fetch_start). Returns a
+    (start, end) pair, or None if no day is missing.
+    '''
+    if covered_start is None or covered_start <= start_date or \
+            fetched_from == start_date:
+        return None
+
+    end = pd.Timestamp(min(covered_start, fetched_from or covered_start)) - \
+        pd.Timedelta(days=1)
+
+    return start_date, min(end.strftime('%Y-%m-%d'), end_date)
+
+
+def merge_incremental(stored, fresh, start_date, end_date, fetched_from,
+                      backfill=None):
+    '''
+    Combine a stored result with the rows fetched from fetched_from
+    onwards (None if nothing was fetched) and those backfilled before the
+    range it covered (see backfill_range): stored rows of the fetched dates
+    are replaced, and rows outside the window start_date - end_date are
+    dropped.
+
+    Returns:
+    -----------
+        df : pandas.DataFrame
+            Sorted by date.
+    '''
+    frames = []
+
+    if stored is not None and len(stored.columns):
+        days = _dates(stored['date'])
+        keep = (days >= pd.Timestamp(start_date)) & (days <= pd.Timestamp(end_date))
+
+        if fetched_from is not None:
+            keep &= days < pd.Timestamp(fetched_from)
+
+        frames.append(stored[keep.values])
+
+    for df in (backfill, fresh):
+        if df is not None and len(df.columns):
+            frames.append(df)
+
+    df = concat_frames(frames)
+
+    if not len(df.columns):
+        return df
+
+    order = _dates(df['date']).argsort(kind='stable')
+
+    return df.iloc[order].reset_index(drop=True)
@@ -1,31 +1,152 @@
-import pandas as pd
-import numpy as np
-
-import httplib2
+import json
 import os
 
-from googleapiclient.discovery import build
-from oauth2client import client, file, tools
-from oauth2client.service_account import ServiceAccountCredentials
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from sys import stdout
 
 
+from ._bisect import run_bisection
+from ._cache import QueryCache
+from ._decoder import DecodedRows, check_decoder, columns_postproc, decode_v3, \
+    decode_v4
+from ._dtypes import FrameBuilder, Interner, concat_frames
+from ._fanout import fanout_tasks, run_fanout, tag_view
+from ._incremental import IncrementalStore, backfill_range, default_restate, \
+    fetch_start, merge_incremental, watermark
 from ._query_parser import QueryParser
-
-no_callback = client.OOB_CALLBACK_URN
+from ._scheduler import Scheduler, default_limits, shared_scheduler
+from ._sharding import date_shards, merge_shards
+from ._sinks import FrameWriter
+from ._spill import SpilledFrame, SpillingBuilder
+
+# NOTE:
+# The google api client, oauth2client and httplib2 are only imported once a
+# service is actually built (see the _init_service methods), so that
+# importing this module stays cheap. The value below is
+# oauth2client.client.OOB_CALLBACK_URN
+no_callback = 'urn:ietf:wg:oauth:2.0:oob'
 default_scope = 'https://www.googleapis.com/auth/analytics.readonly'
 default_discovery = 'https://analyticsreporting.googleapis.com/$discovery/rest'
 default_token_file = os.path.join(os.path.dirname(__file__), 'analytics.dat')
 default_secrets_v3 = os.path.join(os.path.dirname(__file__), 'client_secrets_v3.json')
 default_secrets_v4 = os.path.join(os.path.dirname(__file__), 'client_secrets_v4.json')
 
+# V4 batchGet limits: at most 5 reportRequests per call, all of which must
+# agree on the following fields
+max_report_requests = 5
+batch_keys = ('viewId', 'dateRanges', 'segments', 'samplingLevel', 'cohortGroup')
+
+# Partial response masks holding only what the frame conversion (and the
+# pagination) reads, requested unless the caller asks for something else.
+# The totals, minimums / maximums and other metadata are left out.
+v3_page_fields = 'columnHeaders,rows,nextLink,totalResults,itemsPerPage,' \
+    'containsSampledData'
+v4_report_fields = 'reports(columnHeader,data(rows,rowCount,isDataGolden,' \
+    'samplesReadCounts,samplingSpaceSizes),nextPageToken)'
+
+# Masks of the (single row) probes telling whether a date range is sampled
+v3_probe_fields = 'containsSampledData,sampleSize,sampleSpace'
+v4_probe_fields = 'reports/data(samplesReadCounts,samplingSpaceSizes)'
+
+def _batch_groups(requests):
+    '''
+    Group the indices of V4 report requests that may share a batchGet call
+    '''
+    groups = {}
+
+    for i, req in enumerate(requests):
+        key = json.dumps([req.get(k) for k in batch_keys], sort_keys=True)
+        groups.setdefault(key, []).append(i)
+
+    return list(groups.values())
+
+
+class OAuthDataReaderBase:
+    '''
+    Abstract class holding what the V3 and V4 readers have in common: the
+    authorized credentials, the (thread-safe) transport carrying the
+    requests and the scheduler pacing them.
+    '''
+    _credentials = None
+    _transport = None
+    _scheduler = None
+    _strings = 'category'
+    _record = None
+    _partial = True
+    _decoder = 'json'
+
+    def _recording(self):
+        '''
+        Wrap the transport to record every request / response pair, if
+        asked to
+        '''
+        if self._record is not None:
+            from ._replay import RecordingTransport
+
+            self._transport = RecordingTransport(self._transport, self._record)
+
+    def _default_scheduler(self, secrets):
+        '''
+        The Scheduler of the credential pool used as transport, if any, an
+        unlimited one when replaying recorded responses, else the one
+        shared by every query object using the same secrets
+        '''
+        from ._pool import CredentialPool
+        from ._replay import ReplayTransport
+
+        if isinstance(self._transport, CredentialPool):
+            return self._transport.scheduler(self._api)
+
+        if isinstance(secrets, (list, tuple)):
+            raise ValueError('Several secrets files need a CredentialPool as '
+                             'transport (or no transport, for the V4 reader)')
+
+        if isinstance(self._transport, ReplayTransport):
+            # offline: nothing to pace, and no live project quota to count
+            # the requests against
+            return Scheduler(**dict(default_limits[self._api], qps=None,
+                daily=None, view_daily=None, view_concurrency=None))
+
+        return shared_scheduler(os.path.abspath(secrets), self._api)
+
+    def _builder(self, interner=None, memory_limit=None):
+        '''
+        Builder of the frame of a result, spilling its pages to disk beyond
+        memory_limit (if given)
+        '''
+        if memory_limit is None:
+            return FrameBuilder(self._strings, interner)
+
+        return SpillingBuilder(memory_limit, self._strings, interner)
+
+    def _decoding(self, request, decode):
+        '''
+        Have the response of request decoded straight into column arrays
+        with decode (decode_v3 / decode_v4), if so configured
+        '''
+        if self._decoder == 'columns':
+            request.postproc = columns_postproc(request.postproc, decode)
+
+        return request
+
+    def _execute(self, request, view=None, cost=1):
+        '''
+        Execute a google api request, within the rate limits and with the
+        retries of the scheduler (if any)
+        '''
+        if self._scheduler is None:
+            return request.execute()
+
+        return self._scheduler.call(request.execute, view=view, cost=cost)
 
-class OAuthDataReaderV4:
+
+class OAuthDataReaderV4(OAuthDataReaderBase):
     '''
     Abstract class for handling OAuth2 authentication using the Google
     oauth2client library and the V4 Analytics API
     '''
-    def __init__(self, scope, discovery_uri):
+    def __init__(self, scope, discovery_uri, transport=None):
         '''
         Parameters:
         -----------
@@ -36,33 +157,51 @@ class OAuthDataReaderV4:
                 Designates the authentication scope(s).
             discovery_uri : tuple or string
                 Designates discovery uri(s)
+            transport : httplib2.Http like object
+                Carries (and authorizes) the requests. By default a pooled,
+                thread-safe transport is shared by every query object using
+                the same secrets and scope.
         '''
         self._scope = scope
         self._discovery = discovery_uri
+        self._transport = transport
         self._api = 'v4'
 
     def _init_service(self, secrets):
-        creds = ServiceAccountCredentials\
-            .from_json_keyfile_name(secrets,
-                scopes=self._scope
-            )
-
-        http = creds.authorize(httplib2.Http())
-
-        # silence log warnigns as suggested by
-        # https://github.com/googleapis/google-api-python-client/issues/299
-        return build('analytics', self._api,
-            http=http,
-            discoveryServiceUrl=self._discovery,
-            cache_discovery=False
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        from ._credentials import shared_credentials
+        from ._discovery import build_service
+        from ._transport import shared_transport
+
+        if self._transport is None:
+            # the key file is read once per process, the token is shared
+            # (and refreshed ahead of its expiry) by every query object
+            key = (os.path.abspath(secrets), str(self._scope))
+
+            self._credentials = shared_credentials(key,
+                lambda: ServiceAccountCredentials\
+                    .from_json_keyfile_name(secrets,
+                        scopes=self._scope
+                    ))
+
+            self._transport = shared_transport(key, self._credentials)
+
+        self._recording()
+
+        # built from a local copy of the discovery document, memoized for
+        # the whole process
+        return build_service('analyticsreporting', self._api,
+            http=self._transport,
+            discovery_url=self._discovery
         )
 
-class OAuthDataReader:
+class OAuthDataReader(OAuthDataReaderBase):
     '''
     Abstract class for handling OAuth2 authentication using the Google
     oauth2client library
     '''
-    def __init__(self, scope, token_file_name, redirect):
+    def __init__(self, scope, token_file_name, redirect, transport=None):
         '''
         Parameters:
         -----------
@@ -72,15 +211,22 @@ class OAuthDataReader:
                 Location of cache for authenticated tokens
             redirect : str
                 Redirect URL
+            transport : httplib2.Http like object
+                Carries (and authorizes) the requests. By default a pooled,
+                thread-safe transport is shared by every query object using
+                the same token file and scope.
         '''
         self._scope = scope
         self._redirect_url = redirect
-        self._token_store = file.Storage(token_file_name)
+        self._token_file_name = token_file_name
+        self._token_store = None
+        self._transport = transport
         self._api = 'v3'
 
         # NOTE:
-        # This is a bit rough...
-        self._flags_ = tools.argparser.parse_args(args=[])
+        # This is a bit rough... The flags are only parsed when the
+        # authentication flow actually has to run.
+        self._flags_ = None
 
     def _authenticate(self, secrets):
         '''
@@ -96,16 +242,37 @@ class OAuthDataReader:
         -----
         See google documention for format of secrets file
         '''
-        flow = self._create_flow(secrets)
+        import httplib2
+
+        credentials = self._get_credentials(secrets)
+        http = credentials.authorize(http=httplib2.Http())
+
+        return http
+
+    def _get_credentials(self, secrets):
+        '''
+        Read the credentials from the token store, running the
+        authentication flow if they are missing or invalid
+        '''
+        from oauth2client import file
+
+        if self._token_store is None:
+            self._token_store = file.Storage(self._token_file_name)
 
         credentials = self._token_store.get()
 
         if credentials is None or credentials.invalid:
+            from oauth2client import tools
+
+            if self._flags_ is None:
+                self._flags_ = tools.argparser.parse_args(args=[])
+
+            flow = self._create_flow(secrets)
             credentials = tools.run_flow(flow, self._token_store, self._flags_)
 
-        http = credentials.authorize(http=httplib2.Http())
+        self._credentials = credentials
 
-        return http
+        return credentials
 
     def _create_flow(self, secrets):
         '''
@@ -120,6 +287,8 @@ class OAuthDataReader:
         -----
         See google documentation for format of secrets file
         '''
+        from oauth2client import client, tools
+
         flow = client.flow_from_clientsecrets(secrets,
                                               scope=self._scope,
                                               message=tools.message_if_missing(secrets))
@@ -131,9 +300,26 @@ class OAuthDataReader:
         Build an authenticated google api request service using the given
         secrets file
         '''
-        http = self._authenticate(secrets)
+        from ._credentials import shared_credentials
+        from ._discovery import build_service, default_discovery_v3
+        from ._transport import shared_transport
+
+        if self._transport is None:
+            # the token store is read once per process; refreshed tokens are
+            # written back to it by oauth2client
+            key = (os.path.abspath(self._token_file_name), str(self._scope))
 
-        return build('analytics', self._api, http=http)
+            self._credentials = shared_credentials(key,
+                lambda: self._get_credentials(secrets))
+
+            self._transport = shared_transport(key, self._credentials)
+
+        self._recording()
+
+        return build_service('analytics', self._api,
+            http=self._transport,
+            discovery_url=default_discovery_v3
+        )
 
     def _reset_default_token_store(self):
         os.remove(default_token_file)
@@ -144,7 +330,14 @@ class GoogleAnalyticsQuery(OAuthDataReader):
                  scope=default_scope,
                  token_file_name=default_token_file,
                  redirect=no_callback,
-                 secrets=default_secrets_v3):
+                 secrets=default_secrets_v3,
+                 cache=None,
+                 transport=None,
+                 scheduler=None,
+                 strings='category',
+                 record=None,
+                 partial=True,
+                 decoder='json'):
         '''
         Query the GA API with ease!  Simply obtain the 'client_secrets.json' file
         as usual and move it to the same directory as this file (default) or
@@ -159,14 +352,51 @@ class GoogleAnalyticsQuery(OAuthDataReader):
 
         API queries must be provided as a dict. object, see the execute_query
         docstring for valid options.
+
+        Optionally, pass a QueryCache object as 'cache' to have the results
+        of historical queries (those ending before today) kept on disk.
+
+        Requests are sent through a pooled, thread-safe transport shared by
+        every query object using the same token file and scope. A different
+        httplib2.Http like object may be provided as 'transport', in which
+        case it is expected to authorize the requests itself.
+
+        API calls are paced by a Scheduler (rate limits, daily quotas,
+        concurrency and retries) shared by every query object using the same
+        secrets. Pass a Scheduler object as 'scheduler' to use other limits.
+
+        Columns are typed from the GA column headers, with nullable dtypes
+        for the metrics and datetimes for the date dimensions. The other
+        (string) dimensions are stored as set by 'strings': 'category'
+        (default), 'pyarrow' (Arrow backed strings) or 'object'.
+
+        Pass a file name as 'record' to save every request / response pair
+        (with its latency) to a compressed archive, which ReplayTransport
+        then serves as 'transport' offline, without credentials.
+
+        Only the parts of the responses needed to build the frames are
+        requested ('fields' partial response masks) unless 'partial' is
+        False; results returned as dict objects are never trimmed.
+
+        With decoder='columns', the pages converted to frames are decoded
+        from the raw responses straight into column arrays, instead of one
+        Python object per row and value (decoder='json', default).
         '''
         super(GoogleAnalyticsQuery, self).__init__(scope,
                                                    token_file_name,
-                                                   redirect)
-
+                                                   redirect,
+                                                   transport)
+
+        self._cache = cache
+        self._strings = strings
+        self._record = record
+        self._partial = partial
+        self._decoder = check_decoder(decoder)
+        self._scheduler = scheduler or self._default_scheduler(secrets)
         self._service = self._init_service(secrets)
 
-    def execute_query(self, as_dict=False, all_results=False, **query):
+    def execute_query(self, as_dict=False, all_results=False, workers=1,
+                      memory_limit=None, **query):
         '''
         Execute **query and translate it to a pandas.DataFrame object.
 
@@ -178,6 +408,18 @@ class GoogleAnalyticsQuery(OAuthDataReader):
             all_results : Boolean
                 Obtain the full query results availble from GA (up to sampling limit).
                 This can be VERY time / bandwidth intensive! Default = False
+            workers : int
+                Number of pages to fetch concurrently when all_results is set.
+                The remaining pages are derived from the first response and
+                reassembled in order. Default = 1 (follow 'nextLink' serially)
+            memory_limit : int or str
+                Memory budget of the converted pages, in bytes or as e.g.
+                '2GB'. Once it is reached, the pages are spilled to a
+                temporary Arrow IPC file and the result is a SpilledFrame
+                (memory-mapped, loaded as it is read) instead of a
+                pandas.DataFrame object. Not for as_dict results (a
+                ValueError is raised). Requires pyarrow. Default = None
+                (no limit)
             query : dict.
                 GA query, only with some added flexibility to be a bit sloppy. Adapted from
                 https://developers.google.com/analytics/devguides/reporting/core/v3/reference
@@ -227,8 +469,9 @@ class GoogleAnalyticsQuery(OAuthDataReader):
                                         used the 'as_dict' keyword argument is set
                                         to True and a dict object is returned.
             fields      list    N       Selector specifying a subset of fields to include in
-                                        the response.
-                                        ***NOT CURRENTLY FORMAT-CHECKED***
+                                        the response, e.g. 'columnHeaders,rows'. By default,
+                                        pages after the first are trimmed to what the
+                                        DataFrame object is built from.
             userIp      str     N       Specifies IP address of the end user for whom the API
                                         call is being made. Used to cap usage per IP.
                                         ***NOT CURRENTLY FORMAT-CHECKED***
@@ -242,7 +485,7 @@ class GoogleAnalyticsQuery(OAuthDataReader):
 
         Returns:
         -----------
-            result : pd.DataFrame or dict
+            result : pd.DataFrame, SpilledFrame or dict
             metadata : summary data supplied with query result
         '''
         try:
@@ -255,106 +498,575 @@ class GoogleAnalyticsQuery(OAuthDataReader):
             except KeyError as e:
                 pass
 
-            ga_query = self._service.data().ga().get(**formatted_query)
-
         except TypeError as e:
             raise ValueError(f'Error making query: {e}')
 
-        res = ga_query.execute()
+        if memory_limit is not None and as_dict:
+            raise ValueError('memory_limit only applies to DataFrame results')
 
-        # Fix the 'query' field to be useful to us
-        for key in list(res['query'].keys()):
-            res['query'][key.replace('-', '_')] = res['query'].pop(key)
+        return self._execute_parsed(formatted_query, as_dict, all_results, workers,
+                                    memory_limit=memory_limit)
+
+    def _execute_parsed(self, formatted_query, as_dict=False, all_results=False,
+                        workers=1, interner=None, memory_limit=None, verbose=True):
+        '''
+        execute_query for an already parsed query. The dimension values are
+        encoded with interner (if given), so that frames of related queries
+        (e.g. date shards) can be combined from their category codes. Pages
+        beyond memory_limit (if given) are spilled to disk. Progress is only
+        printed if verbose is set, i.e. not from worker threads.
+        '''
+        # Serve historical queries from the cache, if there is one
+        cache_key = None
+        if self._cache is not None and \
+                QueryCache.cacheable(formatted_query['end_date']):
+            cache_key = QueryCache.key(self._api, formatted_query,
+                as_dict=as_dict, all_results=all_results, strings=self._strings)
+
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        res = self._get(formatted_query, columns=not as_dict)
 
         if as_dict:
+            if cache_key:
+                self._cache.set(cache_key, res)
+
             return res
 
         else:
             # re-cast query result (dict) to a pd.DataFrame object
-            cols = [col['name'][3:] for col in res['columnHeaders']]
+            builder = self._builder(interner, memory_limit)
+            builder.append(self._columns(res))
+
+            # Some kludge to optionally get the the complete query result
+            # up to the sampling limit. Each page is converted as it arrives
+            # (dimensions to category codes) and the frame is assembled
+            # once, at the end.
+            if all_results and res.get('rows') and res.get('nextLink'):
+                if verbose:
+                    print('Obtianing full data set (up to sampling limit).')
+                    print('This can take a VERY long time!')
+
+                # the metadata returned comes from the first page, the
+                # others only need their rows
+                temp_qry = formatted_query
+                if self._partial and 'fields' not in temp_qry:
+                    temp_qry = dict(temp_qry, fields=v3_page_fields)
+
+                for page in self._remaining_pages(temp_qry, res, workers, columns=True,
+                                                  verbose=verbose):
+                    builder.append(self._columns(page))
+
+            df = builder.frame()
 
+            # Return the summary info as well
             try:
-                df = pd.DataFrame(res['rows'], columns=cols)
+                res.pop('rows')
 
-                # Some kludge to optionally get the the complete query result
-                # up to the sampling limit
-                if all_results:
-                    print('Obtianing full data set (up to sampling limit).')
-                    print('This can take a VERY long time!')
+            except KeyError:
+                pass
 
-                    more = True
-                    temp_qry = formatted_query.copy()
+            res.pop('columnHeaders')
 
-                    while more:
-                        try:
-                            temp_qry['start_index'] = \
-                                res['nextLink'].split('start-index=')[1].split('&')[0]
+            # spilled results only live as long as their handle
+            if cache_key and not isinstance(df, SpilledFrame):
+                self._cache.set(cache_key, (df, res))
 
-                            # Monitor progress
-                            curr = int(temp_qry['start_index'])
-                            block = int(res['itemsPerPage'])
-                            total = res['totalResults']
+            return df, res
 
-                            stdout.write('\rGetting rows {0} - {1} of {2}'.\
-                                format(curr, curr + block - 1, total))
-                            stdout.flush()
+    def iter_pages(self, workers=1, **query):
+        '''
+        Iterate over the complete result of **query (up to sampling limit),
+        one page at a time. Only the pages not yet consumed are held in
+        memory.
 
-                            temp_res = self._service.data().ga().get(**temp_qry).execute()
-                            temp_df =  pd.DataFrame(temp_res['rows'], columns=cols)
+        Parameters:
+        -----------
+            workers : int
+                Number of pages to fetch ahead concurrently. Default = 1
+            query : dict.
+                GA query, see the execute_query docstring.
 
-                            df = pd.concat((df, temp_df), ignore_index=True)
+        Yields:
+        -----------
+            page : dict
+                The dict object provided by GA for each page, in order.
+        '''
+        formatted_query = QueryParser().parse(**query)
 
-                            res['nextLink'] = temp_res['nextLink']
+        yield from self._iter_pages(formatted_query, workers)
 
-                        except KeyError:
-                            more = False
+    def _iter_pages(self, formatted_query, workers=1, columns=False):
+        '''
+        iter_pages for an already parsed query; pages are decoded into
+        column arrays if columns is set (see _get)
+        '''
+        res = self._get(formatted_query, columns)
+        more = 'rows' in res and 'nextLink' in res
 
-            except KeyError:
-                df = pd.DataFrame(columns=cols)
-                pass
+        yield res
 
-            # TODO:
-            # A tool to accurtely set the dtype for all columns of df would
-            # be nice, but is probably far more effort than it's worth.
-            # This will get the ball rolling, but the end user is likely
-            # going to be stuck dealing with things on a per-case basis.
-            # We should be able to leverage the resp2frame code below to 
-            # improve the the handling of conversion here.
-            def my_mapper(x):
-                if x == 'INTEGER':
-                    return int
-                elif x == 'BOOLEAN':
-                    return bool
-                else:
-                    # this should work with both 2.7 and 3.4
-                    if isinstance(x, str):
-                        return str
-
-                    else:
-                        return str
-
-            for hdr in res['columnHeaders']:
-                col = hdr['name'][3:]
-                dtp = hdr['dataType']
-
-                df[col] = df[col].apply(my_mapper(dtp))
+        if more:
+            yield from self._remaining_pages(formatted_query, res, workers, columns)
 
-            # Return the summary info as well
-            try:
-                res.pop('rows')
+    def iter_frames(self, workers=1, **query):
+        '''
+        Iterate over the complete result of **query (up to sampling limit),
+        yielding one typed pandas.DataFrame object per page. The raw rows of
+        each page are released as soon as they have been converted, so
+        memory use does not grow with the size of the result.
 
-            except KeyError:
-                pass
+        Parameters:
+        -----------
+            workers : int
+                Number of pages to fetch ahead concurrently. Default = 1
+            query : dict.
+                GA query, see the execute_query docstring.
+        '''
+        # one dictionary for all pages, the categories of a frame are a
+        # prefix of those of the next one
+        interner = Interner()
 
-            res.pop('columnHeaders')
+        formatted_query = QueryParser().parse(**query)
 
-            return df, res
+        if self._partial and 'fields' not in formatted_query:
+            formatted_query['fields'] = v3_page_fields
+
+        for page in self._iter_pages(formatted_query, workers, columns=True):
+            df = self.resp2frame(page, self._strings, interner)
+            page.pop('rows', None)
+
+            yield df
+
+    def execute_query_to(self, path, format='parquet', workers=1, **query):
+        '''
+        Execute **query and write the complete result (up to sampling limit)
+        to a parquet or Arrow IPC file, one page at a time. Each page is
+        written as a parquet row group / Arrow record batch as soon as it is
+        converted, so the size of the export is only limited by disk space.
+        Requires pyarrow.
+
+        Parameters:
+        -----------
+            path : str
+                Output file name.
+            format : str
+                Either 'parquet' or 'arrow'. Default = 'parquet'
+            workers : int
+                Number of pages to fetch ahead concurrently. Default = 1
+            query : dict.
+                GA query, see the execute_query docstring.
+
+        Returns:
+        -----------
+            rows : int
+                Number of rows written.
+        '''
+        with FrameWriter(path, format) as sink:
+            for df in self.iter_frames(workers=workers, **query):
+                sink.write(df)
+
+        return sink.rows
+
+    @staticmethod
+    def resp2frame(res, strings='category', interner=None):
+        '''
+        Convert a single (page of a) query result to a pandas.DataFrame
+        object, casting each column from the dataType of its column header
+        (see _dtypes.to_column). String dimensions are stored as set by
+        strings: 'category', 'pyarrow' or 'object'; categories are taken
+        from interner, if given. The result may also be given as the raw
+        response body (bytes), which is then decoded straight into column
+        arrays.
+        '''
+        if isinstance(res, bytes):
+            res = decode_v3(res) or json.loads(res)
+
+        builder = FrameBuilder(strings, interner)
+        builder.append(GoogleAnalyticsQuery._columns(res))
+
+        return builder.frame()
+
+    @staticmethod
+    def _columns(res):
+        '''
+        (name, values, dataType, is dimension) of every column of a page
+        '''
+        hdrs = res['columnHeaders']
+
+        rows = res.get('rows', [])
+
+        # Transpose the rows once, each column is then cast as a whole
+        if isinstance(rows, DecodedRows):
+            values = rows.columns
+
+        else:
+            values = list(zip(*rows)) or [()] * len(hdrs)
+
+        return [(h['name'][3:], v, h['dataType'], h.get('columnType') == 'DIMENSION') \
+            for h, v in zip(hdrs, values)]
+
+    def _get(self, formatted_query, columns=False):
+        '''
+        Execute a single, already parsed, query and return the dict object
+        provided by GA. Set columns for pages only converted to frames:
+        their rows may then be decoded into column arrays (DecodedRows).
+        '''
+        try:
+            ga_query = self._service.data().ga().get(**formatted_query)
+
+        except TypeError as e:
+            raise ValueError(f'Error making query: {e}')
+
+        if columns:
+            self._decoding(ga_query, decode_v3)
+
+        res = self._execute(ga_query, view=formatted_query.get('ids'))
+
+        # Fix the 'query' field to be useful to us
+        for key in list(res.get('query', {}).keys()):
+            res['query'][key.replace('-', '_')] = res['query'].pop(key)
+
+        return res
+
+    def execute_sharded(self, freq='month', workers=4, aggregate=False, **query):
+        '''
+        Execute **query as one query per day, week or month of its date range
+        and merge the results. Short ranges are far less likely to be sampled
+        than a long one, and the shards are fetched concurrently.
+
+        Parameters:
+        -----------
+            freq : str
+                Shard size, one of 'day', 'week' or 'month'. Default = 'month'
+            workers : int
+                Maximum number of shards fetched at the same time. Default = 4
+            aggregate : Boolean or list
+                Sum the metrics of rows split over several shards back
+                together (grouping on the dimensions). Only valid for additive
+                metrics; a list limits the aggregation to the given metrics.
+                Default = False
+            query : dict.
+                GA query, see the execute_query docstring. All results are
+                obtained for every shard.
+
+        Returns:
+        -----------
+            result : pd.DataFrame
+            metadata : list of the summary data supplied with each shard
+        '''
+        formatted_query = QueryParser().parse(**query)
+        shards = date_shards(formatted_query['start_date'],
+                             formatted_query['end_date'],
+                             freq)
+
+        # the shards share their dimension dictionaries, so merging them
+        # only concatenates category codes
+        interner = Interner()
+
+        def fetch(shard):
+            temp_qry = dict(formatted_query, start_date=shard[0], end_date=shard[1])
+
+            return self._execute_parsed(temp_qry, all_results=True, interner=interner,
+                                        verbose=False)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fetch, shards))
+
+        dims = formatted_query.get('dimensions') or ''
+        dims = [d[3:] for d in dims.split(',') if d]
+
+        df = merge_shards([df for df, _ in results], dims, aggregate)
+
+        return df, [res for _, res in results]
+
+    def execute_bisected(self, workers=4, aggregate=False, **query):
+        '''
+        Execute **query avoiding sampled data: a cheap probe (a single row)
+        tells whether GA samples the date range, in which case the range is
+        split, by the sampling rate reported, and each piece probed in turn,
+        down to single days. The unsampled pieces are fetched concurrently
+        and merged.
+
+        Parameters:
+        -----------
+            workers : int
+                Maximum number of probes and pieces fetched at the same time.
+                Default = 4
+            aggregate : Boolean or list
+                As for execute_sharded. Sums the metrics of rows split over
+                several pieces back together, which is needed for exact
+                totals when the query has no date dimension. Default = False
+            query : dict.
+                GA query, see the execute_query docstring. All results are
+                obtained for every piece.
+
+        Returns:
+        -----------
+            result : pd.DataFrame
+            report : pd.DataFrame
+                One row per date range probed: its depth in the recursion,
+                whether it was sampled (with the sample size and space
+                reported by GA), the number of pieces it was split into and
+                the duration of the probe.
+        '''
+        formatted_query = QueryParser().parse(**query)
+
+        # the pieces share their dimension dictionaries
+        interner = Interner()
+
+        def probe(start, end):
+            temp_qry = {k : v for k, v in formatted_query.items() if k != 'start_index'}
+            temp_qry.update(start_date=start, end_date=end, max_results='1',
+                            fields=v3_probe_fields)
+
+            res = self._get(temp_qry)
+
+            if not res.get('containsSampledData'):
+                return None
+
+            return tuple(int(res[k]) if res.get(k) is not None else None \
+                for k in ('sampleSize', 'sampleSpace'))
+
+        def fetch(start, end):
+            temp_qry = dict(formatted_query, start_date=start, end_date=end)
+
+            df, _ = self._execute_parsed(temp_qry, all_results=True, interner=interner,
+                                         verbose=False)
+
+            return df
+
+        frames, report = run_bisection(probe, fetch, formatted_query['start_date'],
+                                       formatted_query['end_date'], workers)
+
+        dims = formatted_query.get('dimensions') or ''
+        dims = [d[3:] for d in dims.split(',') if d]
+
+        return merge_shards(frames, dims, aggregate), report
+
+    def execute_incremental(self, store=None, restate=default_restate, workers=1, **query):
+        '''
+        Execute **query incrementally: only the days after the high-water
+        date of the previous result (plus the last restate days, which GA may
+        still be processing) are fetched, and merged with the stored result.
+        Re-running a rolling window (e.g. start_date='90daysAgo') every day
+        therefore costs a day or two of data, not the whole window. Days
+        before the range of the previous result (when start_date is moved
+        back) are fetched as well.
+
+        Parameters:
+        -----------
+            store : IncrementalStore
+                Where previous results are kept, keyed by the query without
+                its dates. Default = IncrementalStore()
+            restate : int
+                Number of days before the high-water date fetched again.
+                Default = 2
+            workers : int
+                As for execute_query. Default = 1
+            query : dict.
+                GA query, see the execute_query docstring. The 'date'
+                dimension is required.
+
+        Returns:
+        -----------
+            result : pd.DataFrame
+                Every row of the window start_date - end_date, sorted by date.
+            metadata : summary data supplied with the fetched rows, or None
+                if nothing had to be fetched.
+        '''
+        formatted_query = QueryParser().parse(**query)
+
+        dims = (formatted_query.get('dimensions') or '').split(',')
+        if 'ga:date' not in dims:
+            raise ValueError('Incremental queries require the \'date\' dimension')
+
+        if store is None:
+            store = IncrementalStore()
+
+        start = formatted_query['start_date']
+        end = formatted_query['end_date']
+
+        key = store.key(self._api, {k : v for k, v in formatted_query.items() \
+            if k not in ('start_date', 'end_date')})
+
+        stored, covered = store.load_entry(key)
+
+        # the days an entry saved without its range covers are not known
+        if covered is None:
+            stored = None
+
+        first = fetch_start(start, end, watermark(stored), restate)
+        gap = backfill_range(start, end, covered and covered[0], first)
+
+        fresh, back, res = None, None, None
+        if first is not None:
+            fresh, res = self.execute_query(all_results=True, workers=workers,
+                **dict(formatted_query, start_date=first))
+
+        if gap is not None:
+            back, meta = self.execute_query(all_results=True, workers=workers,
+                **dict(formatted_query, start_date=gap[0], end_date=gap[1]))
+            res = res or meta
+
+        df = merge_incremental(stored, fresh, start, end, first, back)
+        store.save(key, df, (start, end))
+
+        return df, res
+
+    def execute_fanout(self, views, workers=8, iterator=False, **query):
+        '''
+        Run the query template **query for each of many views. The template
+        is parsed once, the views are queried concurrently and a view that
+        fails does not stop the others.
+
+        Parameters:
+        -----------
+            views : iterable
+                View ids (with or without the 'ga:' prefix), or
+                (view, (start_date, end_date)) pairs / (view, start_date,
+                end_date) triples to override the dates of the template.
+            workers : int
+                Maximum number of views queried at the same time. Default = 8
+            iterator : Boolean
+                Return an iterator of (view, result, error) triples, in
+                completion order, instead of a single frame. Either result
+                or error is None. Default = False
+            query : dict.
+                GA query template, see the execute_query docstring. Its 'ids'
+                are ignored; all results are obtained for every view.
+
+        Returns:
+        -----------
+            result : pd.DataFrame
+                Rows of every view that succeeded, in the order of views,
+                tagged with a 'view_id' column.
+            failures : dict
+                The exception raised for each view that failed.
+        '''
+        tasks = fanout_tasks(views)
+
+        # start_date is only optional when every view brings its dates
+        if all(dates for _, dates in tasks):
+            query = dict({'start_date' : 'today'}, **query)
+
+        template = QueryParser().parse(**query)
+
+        # the views share their dimension dictionaries
+        interner = Interner()
+
+        def fetch(view, dates):
+            ids = view if view.startswith('ga:') else f'ga:{view}'
+            temp_qry = dict(template, ids=ids)
+
+            if dates is not None:
+                temp_qry.update(start_date=QueryParser.resolve_date(dates[0]),
+                                end_date=QueryParser.resolve_date(dates[1]))
+
+            df, _ = self._execute_parsed(temp_qry, all_results=True, interner=interner,
+                                         verbose=False)
+
+            return tag_view(df, view)
+
+        results = run_fanout(fetch, tasks, workers)
+
+        if iterator:
+            return results
+
+        # progress is only reported here, not by the workers
+        frames, failures = {}, {}
+        for i, (view, df, error) in enumerate(results, 1):
+            if error is not None:
+                print(f'Query failed for view {view} ({i}/{len(tasks)}): {error}')
+                failures[view] = error
+
+            else:
+                print(f'Obtained {len(df)} rows for view {view} ({i}/{len(tasks)})')
+
+                if len(df):
+                    frames[view] = df
+
+        return concat_frames([frames[v] for v, _ in tasks if v in frames]), failures
+
+    def _remaining_pages(self, formatted_query, res, workers=1, columns=False,
+                         verbose=True):
+        '''
+        Yield every page following the first response, in order, reporting
+        progress on stdout if verbose is set.
+
+        With a single worker the pages are followed one at a time through
+        'nextLink'. Otherwise every remaining 'start_index' is computed from
+        'totalResults' and 'itemsPerPage' of the first response and the pages
+        are fetched concurrently over the (thread-safe) transport. At
+        most twice as many pages as there are workers are fetched ahead of
+        the consumer.
+        '''
+        block = int(res['itemsPerPage'])
+        total = int(res['totalResults'])
+
+        if workers > 1:
+            first = int(formatted_query.get('start_index', 1))
+            starts = iter(range(first + block, total + 1, block))
+
+            def fetch(start_index):
+                return self._get(dict(formatted_query, start_index=str(start_index)),
+                                 columns)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                window = deque((curr, pool.submit(fetch, curr)) \
+                    for _, curr in zip(range(2 * workers), starts))
+
+                while window:
+                    curr, future = window.popleft()
+
+                    # keep the window full, pages are still handed back in order
+                    nxt = next(starts, None)
+                    if nxt is not None:
+                        window.append((nxt, pool.submit(fetch, nxt)))
+
+                    if verbose:
+                        stdout.write('\rGetting rows {0} - {1} of {2}'.\
+                            format(curr, curr + block - 1, total))
+                        stdout.flush()
+
+                    yield future.result()
+
+            return
+
+        next_link = res.get('nextLink')
+        temp_qry = formatted_query.copy()
+
+        while next_link:
+            temp_qry['start_index'] = \
+                next_link.split('start-index=')[1].split('&')[0]
+
+            # Monitor progress
+            curr = int(temp_qry['start_index'])
+
+            if verbose:
+                stdout.write('\rGetting rows {0} - {1} of {2}'.\
+                    format(curr, curr + block - 1, total))
+                stdout.flush()
+
+            temp_res = self._get(temp_qry, columns)
+            next_link = temp_res.get('nextLink')
+
+            yield temp_res
 
 class GoogleAnalyticsQueryV4(OAuthDataReaderV4):
     def __init__(self,
                  scope=default_scope,
                  discovery=default_discovery,
-                 secrets=default_secrets_v4):
+                 secrets=default_secrets_v4,
+                 cache=None,
+                 transport=None,
+                 scheduler=None,
+                 strings='category',
+                 record=None,
+                 partial=True,
+                 decoder='json'):
         '''
         Query the GA API with ease!  Simply obtain the 'client_secrets.json' file
         as usual and move it to the same directory as this file (default) or
@@ -374,15 +1086,58 @@ class GoogleAnalyticsQueryV4(OAuthDataReaderV4):
 
         for additional details.
 
-        TODO:
-        At the very least, the 'fields' parameter should be included here:
-
-            https://developers.google.com/analytics/devguides/reporting/core/v4/parameters
+        Optionally, pass a QueryCache object as 'cache' to have the results
+        of historical queries (all date ranges ending before today) kept on
+        disk.
+
+        Requests are sent through a pooled, thread-safe transport shared by
+        every query object using the same secrets and scope. A different
+        httplib2.Http like object may be provided as 'transport', in which
+        case it is expected to authorize the requests itself.
+
+        API calls are paced by a Scheduler (rate limits, daily quotas,
+        concurrency and retries) shared by every query object using the same
+        secrets. Pass a Scheduler object as 'scheduler' to use other limits.
+
+        To spread the requests over several service accounts (and add up
+        the quotas of their projects), pass a list of client_secrets.json
+        files as 'secrets', or a CredentialPool object as 'transport'. The
+        rate limits and daily quotas are then enforced per credential by
+        the pool.
+
+        Columns are typed from the GA column headers, with nullable dtypes
+        for the metrics and datetimes for the date dimensions. The other
+        (string) dimensions are stored as set by 'strings': 'category'
+        (default), 'pyarrow' (Arrow backed strings) or 'object'.
+
+        Pass a file name as 'record' to save every request / response pair
+        (with its latency) to a compressed archive, which ReplayTransport
+        then serves as 'transport' offline, without credentials.
+
+        Only the parts of the responses needed to build the frames are
+        requested ('fields' partial response masks) unless 'partial' is
+        False; results returned as dict objects are never trimmed.
+
+        With decoder='columns', the pages converted to frames are decoded
+        from the raw responses straight into column arrays, instead of one
+        Python object per row and value (decoder='json', default).
         '''
-        super(GoogleAnalyticsQueryV4, self).__init__(scope, discovery)
+        if transport is None and isinstance(secrets, (list, tuple)):
+            from ._pool import CredentialPool
+
+            transport = CredentialPool.from_secrets(secrets, scope)
+
+        super(GoogleAnalyticsQueryV4, self).__init__(scope, discovery, transport)
+        self._cache = cache
+        self._strings = strings
+        self._record = record
+        self._partial = partial
+        self._decoder = check_decoder(decoder)
+        self._scheduler = scheduler or self._default_scheduler(secrets)
         self._service = self._init_service(secrets)
 
-    def execute_query(self, query, as_dict=False, all_results=True):
+    def execute_query(self, query, as_dict=False, all_results=True, fields=None,
+                      memory_limit=None):
         '''
         Execute **query and translate it to a pandas.DataFrame object.
 
@@ -400,105 +1155,646 @@ class GoogleAnalyticsQueryV4(OAuthDataReaderV4):
             all_results : Boolean
                 Get all the data for the query instead of the 1000-row limit.
                 Defualt = True
+            fields : str or list
+                Partial response selector, e.g.
+                'reports(columnHeader,data/rows,nextPageToken)'. By default
+                the responses are trimmed to what the DataFrame object is
+                built from, and complete when as_dict is set.
+            memory_limit : int or str
+                Memory budget of the converted pages, in bytes or as e.g.
+                '2GB'. Once it is reached, the pages are spilled to a
+                temporary Arrow IPC file and the result is a SpilledFrame
+                (memory-mapped, loaded as it is read) instead of a
+                pandas.DataFrame object. Only for queries holding a single
+                report request, with all_results (a ValueError is raised
+                otherwise). Requires pyarrow.
+                Default = None (no limit)
 
         Returns:
         -----------
-            df : pandas.DataFrame
+            df : pandas.DataFrame or SpilledFrame
                 Reformatted response to **query.
         '''
+        if memory_limit is not None and \
+                (as_dict or not all_results or len(query['reportRequests']) != 1):
+            raise ValueError('memory_limit only applies to DataFrame results of '
+                             'a single report request, with all_results')
+
+        return self._execute_body(query, as_dict, all_results, fields=fields,
+                                  memory_limit=memory_limit)
+
+    def _execute_body(self, query, as_dict=False, all_results=True, interner=None,
+                      fields=None, memory_limit=None):
+        '''
+        execute_query, encoding the dimension values with interner (if
+        given) so that frames of related queries can be combined from their
+        category codes. The pages of a single report request beyond
+        memory_limit (if given) are spilled to disk.
+        '''
+        # Serve historical queries from the cache, if there is one
+        cache_key = None
+        if self._cache is not None:
+            canonical = self._canonical(query)
+            ends = [rng.get('endDate') for req in canonical['reportRequests'] \
+                for rng in req.get('dateRanges', [])]
+
+            if ends and QueryCache.cacheable(*ends):
+                options = {'as_dict' : as_dict, 'all_results' : all_results,
+                           'strings' : self._strings}
+
+                if fields is not None:
+                    options['fields'] = QueryParser.check_fields(fields)
+
+                cache_key = QueryCache.key(self._api, canonical, **options)
+
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
         if all_results:
-            out = {'reports' : []}
+            # every request in the body is paginated, not only the first one
+            body = {k : v for k, v in query.items() if k != 'reportRequests'}
+            results = self._collect(query['reportRequests'], as_dict,
+                                    interner=interner or Interner(),
+                                    fields=fields, memory_limit=memory_limit,
+                                    **body)
 
-            while True:
-                response = self._service.reports().batchGet(body=query).execute()
-                out['reports'] += response['reports']
+            if as_dict:
+                out = {'reports' : [r for res in results for r in res['reports']]}
 
-                tkn = response.get('reports', [])[0].get('nextPageToken', '')
-                if tkn:
-                    query['reportRequests'][0].update({'pageToken' : tkn})
+            elif isinstance(results[0], SpilledFrame):
+                out = results[0]
 
-                else:
-                    _ = query.pop('reportRequests')[0].get('pageToken')
-                    break
+            else:
+                out = self._concat(results)
 
         else:
-            out = self._service.reports().batchGet(body=query).execute()
+            requests = query['reportRequests']
+            request = self._service.reports().batchGet(body=query,
+                fields=self._mask(fields, as_dict))
+
+            if not as_dict:
+                self._decoding(request, decode_v4)
+
+            out = self._execute(request, view=requests[0].get('viewId'),
+                                cost=len(requests))
+
+            if not as_dict:
+                out = self.resp2frame(out, self._strings, interner)
+
+        # spilled results only live as long as their handle
+        if cache_key and not isinstance(out, SpilledFrame):
+            self._cache.set(cache_key, out)
+
+        return out
+
+    def execute_sharded(self, query, freq='month', workers=4, aggregate=False):
+        '''
+        Execute query as one query per day, week or month of each of its
+        date ranges and merge the results. Short ranges are far less likely
+        to be sampled than a long one, and the shards are fetched
+        concurrently.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query. Every report request must
+                have its 'dateRanges' set; each range is sharded separately.
+            freq : str
+                Shard size, one of 'day', 'week' or 'month'. Default = 'month'
+            workers : int
+                Maximum number of shards fetched at the same time. Default = 4
+            aggregate : Boolean or list
+                Sum the metrics of rows split over several shards back
+                together (grouping on the dimensions). Only valid for additive
+                metrics; a list limits the aggregation to the given metrics.
+                Default = False
+
+        Returns:
+        -----------
+            df : pandas.DataFrame
+                Merged response to query.
+        '''
+        shards = {}
+        dims = []
+
+        for req in query['reportRequests']:
+            if not req.get('dateRanges'):
+                raise ValueError('Sharding requires \'dateRanges\' in every report request')
+
+            for rng in req['dateRanges']:
+                start = QueryParser.resolve_date(rng['startDate'])
+                end = QueryParser.resolve_date(rng['endDate'])
+
+                for shard in date_shards(start, end, freq):
+                    temp_rng = [{'startDate' : shard[0], 'endDate' : shard[1]}]
+                    shards.setdefault(shard, []).append(dict(req, dateRanges=temp_rng))
+
+            for d in req.get('dimensions', []):
+                name = d['name'].replace('ga:', '')
+                if name not in dims:
+                    dims.append(name)
+
+        # the shards share their dimension dictionaries, so merging them
+        # only concatenates category codes
+        interner = Interner()
+
+        def fetch(requests):
+            return self._collect(requests, interner=interner)
+
+        # requests of the same shard share their dates, so are batched together
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fetch, [shards[k] for k in sorted(shards)]))
+
+        return merge_shards([df for dfs in results for df in dfs], dims, aggregate)
+
+    def execute_bisected(self, query, workers=4, aggregate=False):
+        '''
+        Execute query avoiding sampled data: a cheap probe (a single row per
+        report request) tells whether GA samples the date range, in which
+        case the range is split, by the sampling rate reported, and each
+        piece probed in turn, down to single days. The unsampled pieces are
+        fetched concurrently and merged.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query. Its report requests must
+                all have the same, single, date range.
+            workers : int
+                Maximum number of probes and pieces fetched at the same time.
+                Default = 4
+            aggregate : Boolean or list
+                As for execute_sharded. Sums the metrics of rows split over
+                several pieces back together, which is needed for exact
+                totals when the query has no date dimension. Default = False
+
+        Returns:
+        -----------
+            df : pandas.DataFrame
+                Merged response to query.
+            report : pandas.DataFrame
+                One row per date range probed, see
+                GoogleAnalyticsQuery.execute_bisected.
+        '''
+        requests = query['reportRequests']
+        ranges = {json.dumps(req.get('dateRanges'), sort_keys=True) for req in requests}
+
+        if len(ranges) != 1 or len(requests[0].get('dateRanges') or []) != 1:
+            raise ValueError('Bisection requires the same, single, \'dateRanges\' '
+                             'entry in every report request')
+
+        rng = requests[0]['dateRanges'][0]
+        body = {k : v for k, v in query.items() if k != 'reportRequests'}
+
+        dims = []
+        for req in requests:
+            for d in req.get('dimensions', []):
+                name = d['name'].replace('ga:', '')
+                if name not in dims:
+                    dims.append(name)
+
+        # the pieces share their dimension dictionaries
+        interner = Interner()
+
+        def pieces(start, end, **extra):
+            temp_rng = [{'startDate' : start, 'endDate' : end}]
+
+            return [dict(req, dateRanges=temp_rng, **extra) for req in requests]
+
+        def probe(start, end):
+            sampling = []
+
+            for _, report in self._iter_reports(pieces(start, end, pageSize=1),
+                    all_results=False, fields=v4_probe_fields, **body):
+                data = report.get('data', {})
+
+                if data.get('samplesReadCounts'):
+                    sampling.append((int(data['samplesReadCounts'][0]),
+                                     int(data['samplingSpaceSizes'][0])))
+
+            if not sampling:
+                return None
+
+            # the most sampled report decides
+            return max(sampling, key=lambda s: s[1] / max(s[0], 1))
+
+        def fetch(start, end):
+            return self._collect(pieces(start, end), interner=interner, **body)
+
+        results, report = run_bisection(probe, fetch,
+            QueryParser.resolve_date(rng['startDate']),
+            QueryParser.resolve_date(rng['endDate']), workers)
+
+        return merge_shards([df for dfs in results for df in dfs], dims, aggregate), report
+
+    def execute_incremental(self, query, store=None, restate=default_restate):
+        '''
+        Execute query incrementally: only the days after the high-water date
+        of the previous result (plus the last restate days, which GA may
+        still be processing) are fetched, and merged with the stored result.
+        Re-running a rolling window (e.g. startDate '90daysAgo') every day
+        therefore costs a day or two of data, not the whole window. Days
+        before the range of the previous result (when startDate is moved
+        back) are fetched as well.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query, holding a single report
+                request with a single date range and the 'ga:date'
+                dimension.
+            store : IncrementalStore
+                Where previous results are kept, keyed by the query without
+                its dates. Default = IncrementalStore()
+            restate : int
+                Number of days before the high-water date fetched again.
+                Default = 2
+
+        Returns:
+        -----------
+            df : pandas.DataFrame
+                Every row of the date range, sorted by date.
+        '''
+        if len(query['reportRequests']) != 1:
+            raise ValueError('Incremental queries take a single report request')
+
+        canonical = self._canonical(query)
+        req = canonical['reportRequests'][0]
+
+        if len(req.get('dateRanges', [])) != 1:
+            raise ValueError('Incremental queries take a single date range')
+
+        if 'date' not in [d['name'].replace('ga:', '') for d in req.get('dimensions', [])]:
+            raise ValueError('Incremental queries require the \'ga:date\' dimension')
+
+        if store is None:
+            store = IncrementalStore()
+
+        start = req['dateRanges'][0]['startDate']
+        end = req['dateRanges'][0]['endDate']
+
+        key = store.key(self._api, dict(canonical,
+            reportRequests=[dict(req, dateRanges=None)]))
+
+        stored, covered = store.load_entry(key)
+
+        # the days an entry saved without its range covers are not known
+        if covered is None:
+            stored = None
+
+        first = fetch_start(start, end, watermark(stored), restate)
+        gap = backfill_range(start, end, covered and covered[0], first)
+
+        def fetch(start_date, end_date):
+            temp_rng = [{'startDate' : start_date, 'endDate' : end_date}]
+
+            return self.execute_query(dict(canonical,
+                reportRequests=[dict(req, dateRanges=temp_rng)]))
+
+        fresh = fetch(first, end) if first is not None else None
+        back = fetch(*gap) if gap is not None else None
+
+        df = merge_incremental(stored, fresh, start, end, first, back)
+        store.save(key, df, (start, end))
+
+        return df
+
+    def execute_fanout(self, query, views, workers=8, iterator=False):
+        '''
+        Run the query template query for each of many views. The views are
+        queried concurrently and a view that fails does not stop the others.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query; the 'viewId' of its report
+                requests is set for each view.
+            views : iterable
+                View ids, or (view, (start_date, end_date)) pairs /
+                (view, start_date, end_date) triples to override the
+                'dateRanges' of the template.
+            workers : int
+                Maximum number of views queried at the same time. Default = 8
+            iterator : Boolean
+                Return an iterator of (view, result, error) triples, in
+                completion order, instead of a single frame. Either result
+                or error is None. Default = False
+
+        Returns:
+        -----------
+            df : pandas.DataFrame
+                Rows of every view that succeeded, in the order of views,
+                tagged with a 'view_id' column.
+            failures : dict
+                The exception raised for each view that failed.
+        '''
+        tasks = fanout_tasks(views)
+
+        # the views share their dimension dictionaries
+        interner = Interner()
+
+        def fetch(view, dates):
+            requests = [dict(req, viewId=view) for req in query['reportRequests']]
+
+            if dates is not None:
+                temp_rng = [{'startDate' : dates[0], 'endDate' : dates[1]}]
+                requests = [dict(req, dateRanges=temp_rng) for req in requests]
+
+            df = self._execute_body(dict(query, reportRequests=requests),
+                                    interner=interner)
+
+            return tag_view(df, view)
+
+        results = run_fanout(fetch, tasks, workers)
+
+        if iterator:
+            return results
+
+        # progress is only reported here, not by the workers
+        frames, failures = {}, {}
+        for i, (view, df, error) in enumerate(results, 1):
+            if error is not None:
+                print(f'Query failed for view {view} ({i}/{len(tasks)}): {error}')
+                failures[view] = error
+
+            else:
+                print(f'Obtained {len(df)} rows for view {view} ({i}/{len(tasks)})')
+
+                if len(df):
+                    frames[view] = df
+
+        return concat_frames([frames[v] for v, _ in tasks if v in frames]), failures
+
+    @staticmethod
+    def _canonical(query):
+        '''
+        Copy of the query body with every dateRanges entry resolved to
+        absolute dates, so that it can serve as a cache key.
+        '''
+        body = json.loads(json.dumps(query))
+
+        for req in body.get('reportRequests', []):
+            for rng in req.get('dateRanges', []):
+                for k in ('startDate', 'endDate'):
+                    if k in rng:
+                        rng[k] = QueryParser.resolve_date(rng[k])
+
+        return body
+
+    def execute_many(self, requests, as_dict=False, all_results=True, fields=None):
+        '''
+        Execute an arbitrary number of report requests with as few batchGet
+        calls as possible and translate each to a pandas.DataFrame object.
+
+        Parameters:
+        -----------
+            requests : list
+                Report requests, i.e. the individual entries one would put in
+                the 'reportRequests' list of a query. Requests that share the
+                same viewId, dateRanges, segments, samplingLevel and
+                cohortGroup are packed together, up to 5 per batchGet call.
+            as_dict : Boolean
+                Return a dict of the form {'reports' : [...]} per request
+                instead of the DataFrame object. Default = False
+            all_results : Boolean
+                Get all the data for every request instead of the 1000-row
+                limit. Each report is paginated independently. Default = True
+            fields : str or list
+                Partial response selector, as for execute_query.
+
+        Returns:
+        -----------
+            result : list
+                One pandas.DataFrame (or dict) per request, in the order given.
+        '''
+        return self._collect(requests, as_dict, all_results, fields=fields)
+
+    def iter_pages(self, query, fields=None):
+        '''
+        Iterate over the complete result of query, one report page at a time.
+        Only the pages not yet consumed are held in memory.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query. When it holds several report
+                requests, their pages are yielded as they are received.
+            fields : str or list
+                Partial response selector, as for execute_query. Default =
+                None (complete pages)
+
+        Yields:
+        -----------
+            report : dict
+                One entry of the 'reports' list provided by GA per page.
+        '''
+        body = {k : v for k, v in query.items() if k != 'reportRequests'}
+        fields = self._mask(fields, as_dict=True)
+
+        for _, report in self._iter_reports(query['reportRequests'], fields=fields, **body):
+            yield report
+
+    def iter_frames(self, query):
+        '''
+        Iterate over the complete result of query, yielding one typed
+        pandas.DataFrame object per report page. The raw JSON of each page is
+        released as soon as it has been converted, so memory use does not
+        grow with the size of the result.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query.
+        '''
+        # one dictionary for all pages, the categories of a frame are a
+        # prefix of those of the next one
+        interner = Interner()
+
+        body = {k : v for k, v in query.items() if k != 'reportRequests'}
+        reports = self._iter_reports(query['reportRequests'], fields=self._mask(),
+                                     columns=True, **body)
+
+        for _, report in reports:
+            df = self.resp2frame({'reports' : [report]}, self._strings, interner)
+            report.pop('data', None)
+
+            yield df
+
+    def execute_query_to(self, query, path, format='parquet'):
+        '''
+        Execute query and write the complete result to a parquet or Arrow IPC
+        file, one page at a time. Each page is written as a parquet row group
+        / Arrow record batch as soon as it is converted, so the size of the
+        export is only limited by disk space. Requires pyarrow.
+
+        Parameters:
+        -----------
+            query: dict
+                Query body as for execute_query, holding a single report
+                request (the columns of different requests differ).
+            path : str
+                Output file name.
+            format : str
+                Either 'parquet' or 'arrow'. Default = 'parquet'
+
+        Returns:
+        -----------
+            rows : int
+                Number of rows written.
+        '''
+        if len(query['reportRequests']) != 1:
+            raise ValueError('Only a single report request can be written to a file')
+
+        with FrameWriter(path, format) as sink:
+            for df in self.iter_frames(query):
+                sink.write(df)
+
+        return sink.rows
+
+    def _collect(self, requests, as_dict=False, all_results=True, interner=None,
+                 fields=None, memory_limit=None, **body):
+        '''
+        Execute the report requests and gather the result of each of them:
+        either a dict of the form {'reports' : [...]}, or a pandas.DataFrame
+        object for which every page is converted (dimensions to category
+        codes) as soon as it arrives. Pass an interner to share the
+        dimension dictionaries between the requests, when their frames are
+        to be combined. The pages of each request beyond memory_limit (if
+        given) are spilled to disk, making its result a SpilledFrame.
+        '''
+        pages = [[] for _ in requests]
+        builders = [self._builder(interner, memory_limit) for _ in requests]
+        fields = self._mask(fields, as_dict)
+
+        for i, report in self._iter_reports(requests, all_results, fields,
+                                            columns=not as_dict, **body):
+            if as_dict:
+                pages[i].append(report)
+
+            else:
+                builders[i].append(self._columns(report))
+                report.pop('data', None)
 
         if as_dict:
-            return out
+            return [{'reports' : p} for p in pages]
 
         else:
-            return self.resp2frame(out)
+            return [b.frame() for b in builders]
 
-    @staticmethod
-    def resp2frame(resp):
-        # return object
-        out = pd.DataFrame()
-        # GA data type to data frame conversion
-        lookup = {
-          'INTEGER'     : 'int32',
-          'FLOAT'       : 'float32',
-          'CURRENCY'    : 'float32',
-          'PERCENT'     : 'float32',
-          'TIME'        : 'object',
-          'STRING'      : 'object'
-        }
+    def _iter_reports(self, requests, all_results=True, fields=None, columns=False,
+                      **body):
+        '''
+        Pack compatible report requests into batchGet calls and follow the
+        'nextPageToken' of each report on its own. Requests still needing
+        pages are re-packed together, so batches stay as full as possible.
+        The responses are trimmed to the fields selector, if given, and
+        their rows may be decoded into column arrays if columns is set.
 
-        # Loop through reports and get metrics and dimensions
-        for report in resp.get('reports', []):
-            col_hdrs = report.get('columnHeader', {})
-            # Get the initial dimensions
-            cols = col_hdrs.get('dimensions', [])
-            metric_cols = []
+        Yields (index of the request, report page) pairs.
+        '''
+        for pending in _batch_groups(requests):
+            # work on copies so the callers requests are not left with
+            # page tokens in them
+            todo = {i : dict(requests[i]) for i in pending}
 
-            if 'metricHeader' in col_hdrs:
-                metrics = col_hdrs.get('metricHeader', {}).get('metricHeaderEntries', [])
-                cols_data_type = {}
+            while pending:
+                batch = pending[:max_report_requests]
+                pending = pending[max_report_requests:]
 
-                for m in metrics:
-                    # Get each metric and the data type
-                    cols += [m.get('name')]
-                    cols_data_type[m.get('name')] = lookup[m.get('type')]
+                temp_body = dict(body, reportRequests=[todo[i] for i in batch])
+                request = self._service.reports().batchGet(body=temp_body, fields=fields)
 
-            # Take out any "ga:" prefixes
-            cols = list(map(lambda x: x.replace('ga:', ''), cols))
+                if columns:
+                    self._decoding(request, decode_v4)
 
-            # Set the dataframe with the column names
-            df = pd.DataFrame(columns=cols)
+                response = self._execute(request, view=todo[batch[0]].get('viewId'),
+                                         cost=len(batch))
 
-            # Get the rows from the GA report
-            rows = report.get('data', {}).get('rows')
+                for i, report in zip(batch, response.get('reports', [])):
+                    tkn = report.get('nextPageToken', '')
+                    if tkn and all_results:
+                        todo[i]['pageToken'] = tkn
+                        pending.append(i)
 
-            # Let's loop through the rows to get the dimensions and metrics to row list
-            for row in rows:
-                row_list = row.get('dimensions', [])
+                    yield i, report
 
-                if 'metrics' in list(row.keys()):
-                    metrics = row.get('metrics', [])
-                    for m in metrics:
-                        row_list = row_list + m.get('values')
+    def _mask(self, fields=None, as_dict=False):
+        '''
+        Partial response selector of a call: the one given (format checked),
+        else the fields the frames are built from, unless the dict objects
+        are returned or partial responses are turned off.
+        '''
+        if fields is not None:
+            return QueryParser.check_fields(fields)
 
-                # Make each row an enumerated dictionary with index value starting
-                # at 0
-                drow = {}
-                for i, c in enumerate(cols):
-                    drow.update({c : row_list[i]})
+        if self._partial and not as_dict:
+            return v4_report_fields
 
-                # Concatanate the row to the overall list
-                df = pd.concat((df, pd.DataFrame(drow, index=[0])),
-                               ignore_index=True)
+        return None
 
-            # Copy the dataframe to the returning object
-            out = pd.concat((out, df), ignore_index=True)
+    @staticmethod
+    def _concat(frames):
+        return concat_frames(frames)
 
-            # Convert the object types to the inferred ones
-            out = out.apply(pd.to_numeric, errors='ignore', axis=1)
+    @staticmethod
+    def resp2frame(resp, strings='category', interner=None):
+        '''
+        Convert a batchGet response (or one report page wrapped as
+        {'reports' : [report]}) to a pandas.DataFrame object, casting each
+        column with _dtypes.to_column. String dimensions are stored as set
+        by strings: 'category', 'pyarrow' or 'object'; categories are taken
+        from interner, if given. The response may also be given as the raw
+        body (bytes), which is then decoded straight into column arrays.
+        '''
+        if isinstance(resp, bytes):
+            resp = decode_v4(resp) or json.loads(resp)
 
-            # Explicitly convert date back to a date object
-            if 'date' in out.columns:
-                out['date'] = pd.to_datetime(out['date'], format='%Y%m%d')
+        frames = []
 
-        return out
+        # Loop through reports and get metrics and dimensions
+        for report in resp.get('reports', []):
+            builder = FrameBuilder(strings, interner)
+            builder.append(GoogleAnalyticsQueryV4._columns(report))
+
+            frames.append(builder.frame())
+
+        # Copy the dataframes to the returning object; dates are already
+        # converted by to_column
+        return concat_frames(frames)
+
+    @staticmethod
+    def _columns(report):
+        '''
+        (name, values, type, is dimension) of every column of a report page
+        '''
+        col_hdrs = report.get('columnHeader', {})
+        metrics = col_hdrs.get('metricHeader', {}).get('metricHeaderEntries', [])
+
+        # Take out any "ga:" prefixes
+        dims = [d.replace('ga:', '') for d in col_hdrs.get('dimensions', [])]
+        mets = [m.get('name').replace('ga:', '') for m in metrics]
+        types = [m.get('type') for m in metrics]
+
+        # Get the rows from the GA report
+        rows = report.get('data', {}).get('rows') or []
+
+        # Single pass over the rows, transposing them into one sequence
+        # per column. Only the values of the first date range are kept.
+        if isinstance(rows, DecodedRows):
+            dim_cols, met_cols = rows.columns[:len(dims)], rows.columns[len(dims):]
+
+        else:
+            dim_cols = list(zip(*[row.get('dimensions', []) for row in rows]))
+            met_cols = list(zip(*[row.get('metrics', [{}])[0].get('values', [])
+                                  for row in rows]))
+
+        if not rows:
+            dim_cols = [()] * len(dims)
+            met_cols = [()] * len(mets)
+
+        return [(name, values, 'STRING', True) for name, values in zip(dims, dim_cols)] + \
+            [(name, values, dtp, False) for name, dtp, values in zip(mets, types, met_cols)]
 
 
 
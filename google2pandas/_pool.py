@@ -0,0 +1,268 @@
+import pandas as pd
+
+import httplib2
+import logging
+import os
+import threading
+import time
+
+from ._credentials import shared_credentials
+from ._scheduler import DailyQuota, QuotaExhausted, Scheduler, TokenBucket, \
+    _quota_day, default_limits, error_reason, retry_reasons
+from ._transport import PooledHttp, default_pool_size
+
+logger = logging.getLogger(__name__)
+
+# seconds a credential is left out after hitting a rate limit
+default_cooldown = 60.
+
+# GA error reason once the daily quota of a project is used up
+daily_limit_reasons = ('dailyLimitExceeded',)
+
+
+class _Member(object):
+    '''
+    A credential of a CredentialPool, with its transport, rate limits and
+    counters
+    '''
+    def __init__(self, name, credentials, qps, daily, size):
+        self.name = name
+        self.credentials = credentials
+        self.transport = PooledHttp(credentials, size=size)
+        self.bucket = TokenBucket(qps) if qps else None
+        self.daily = DailyQuota(daily, name) if daily else None
+        self.size = size
+
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.cooling = 0.
+        self.exhausted = None
+
+    def used(self):
+        '''
+        Share of the daily quota used today
+        '''
+        if self.daily is None:
+            return 0.
+
+        return self.daily.used() / self.daily.limit
+
+
+class CredentialPool(object):
+    '''
+    httplib2.Http like object spreading the requests of one (or several)
+    query objects over several credentials, e.g. service accounts of
+    different projects with access to the same views, so that their quotas
+    add up.
+
+    Every credential has its own pooled transport, rate limit and daily
+    quota. Each request goes to the least loaded credential (fewest
+    requests in flight, then least quota used today). A credential hitting
+    a rate limit is left out for a while (cooldown) and the request is sent
+    again with another one; one whose daily quota is used up is left out
+    until the quota is reset.
+
+    Pass it as 'transport' to a query object, which then paces its calls
+    with the Scheduler of the pool (see scheduler) rather than the one of a
+    single project.
+    '''
+    def __init__(self, credentials, qps=default_limits['v4']['qps'],
+                 daily=default_limits['v4']['daily'], size=default_pool_size,
+                 cooldown=default_cooldown, names=None):
+        '''
+        Parameters:
+        -----------
+            credentials : list
+                SharedCredentials or oauth2client credentials objects.
+            qps : float
+                Sustained requests per second of each credential (project).
+                None disables the limit. Default = 20 (V4)
+            daily : int
+                Requests per day of each credential. None disables the
+                limit. Default = 50000
+            size : int
+                Maximum number of concurrent requests per credential.
+                Default = 10
+            cooldown : float
+                Seconds a rate limited credential is left out. Default = 60
+            names : list
+                Names of the credentials in status and errors. Default =
+                'credential 0', 'credential 1', ...
+        '''
+        if not credentials:
+            raise ValueError('A credential pool needs at least one credential')
+
+        names = names or [f'credential {i}' for i in range(len(credentials))]
+
+        self.cooldown = cooldown
+        self.members = [_Member(name, c, qps, daily, size) \
+            for name, c in zip(names, credentials)]
+
+        self._lock = threading.Lock()
+        self._schedulers = {}
+
+    @classmethod
+    def from_secrets(cls, secrets, scope=None, **kwargs):
+        '''
+        Pool of the service accounts of the given client_secrets.json files.
+        The credentials are shared with any query object using the same
+        file and scope.
+
+        Parameters:
+        -----------
+            secrets : list
+                Paths to service account client_secrets.json files.
+            scope : str
+                Authentication scope. Default = the read-only analytics scope
+            kwargs :
+                As for CredentialPool.
+        '''
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        if scope is None:
+            from ._panalysis_ga import default_scope
+            scope = default_scope
+
+        credentials = [shared_credentials((os.path.abspath(f), str(scope)),
+            lambda f=f: ServiceAccountCredentials.from_json_keyfile_name(f, scopes=scope)) \
+                for f in secrets]
+
+        kwargs.setdefault('names', [os.path.basename(f) for f in secrets])
+
+        return cls(credentials, **kwargs)
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        '''
+        Same signature and return value as httplib2.Http.request
+        '''
+        tried = set()
+
+        while True:
+            member = self._acquire(tried)
+
+            # rate limited by every credential: leave it to the scheduler
+            # to back off
+            if member is None:
+                return resp, content
+
+            try:
+                resp, content = member.transport.request(uri, method=method,
+                    body=body, headers=headers, redirections=redirections,
+                    connection_type=connection_type)
+
+            except Exception:
+                self._release(member, error=True)
+                raise
+
+            reason = error_reason(content) if resp.status >= 400 else None
+            self._release(member, error=resp.status >= 400)
+
+            if resp.status == 429 or reason in retry_reasons[:3]:
+                self._bench(member, reason)
+
+            elif reason in daily_limit_reasons:
+                self._bench(member, reason, day=True)
+
+            else:
+                return resp, content
+
+            # rate limited: send again with another credential
+            tried.add(member)
+
+    def scheduler(self, api='v4'):
+        '''
+        Scheduler for the query objects using the pool: the rate limits and
+        daily quotas of the credentials are enforced by the pool, only the
+        limits per view, the concurrency and the retries are left to the
+        scheduler.
+        '''
+        with self._lock:
+            if api not in self._schedulers:
+                limits = dict(default_limits[api], qps=None, daily=None)
+                limits['concurrency'] = sum(m.size for m in self.members)
+
+                self._schedulers[api] = Scheduler(**limits)
+
+            return self._schedulers[api]
+
+    def status(self):
+        '''
+        Usage of every credential, as a pandas.DataFrame object
+        '''
+        now = time.monotonic()
+
+        with self._lock:
+            rows = [(m.name, m.requests, m.errors, m.rate_limited, m.inflight,
+                     m.used(), max(m.cooling - now, 0.), m.exhausted == _quota_day()) \
+                for m in self.members]
+
+        return pd.DataFrame(rows, columns=['credential', 'requests', 'errors',
+            'rate_limited', 'inflight', 'daily_used', 'cooldown', 'exhausted'])
+
+    def close(self):
+        for m in self.members:
+            m.transport.close()
+
+    def _acquire(self, tried=()):
+        '''
+        Pick the least loaded credential not in tried, preferring those not
+        cooling down, and take a request from its quotas. Returns None if
+        every credential left has been tried.
+        '''
+        while True:
+            with self._lock:
+                now, today = time.monotonic(), _quota_day()
+
+                candidates = [m for m in self.members if m.exhausted != today]
+
+                if not candidates:
+                    raise QuotaExhausted('Daily quota used up for every credential of the pool')
+
+                candidates = [m for m in candidates if m not in tried]
+
+                if not candidates:
+                    return None
+
+                member = min(candidates, key=lambda m: (m.cooling > now,
+                    m.inflight / m.size, m.used()))
+
+                member.inflight += 1
+
+            try:
+                if member.daily is not None:
+                    member.daily.take()
+
+            except QuotaExhausted:
+                self._release(member, sent=False)
+                self._bench(member, day=True)
+                continue
+
+            if member.bucket is not None:
+                time.sleep(member.bucket.reserve())
+
+            return member
+
+    def _release(self, member, sent=True, error=False):
+        with self._lock:
+            member.inflight -= 1
+            member.requests += bool(sent)
+            member.errors += bool(error)
+
+    def _bench(self, member, reason=None, day=False):
+        with self._lock:
+            if day:
+                member.exhausted = _quota_day()
+
+            else:
+                member.rate_limited += 1
+                member.cooling = time.monotonic() + self.cooldown
+
+        if day:
+            logger.warning('Daily quota used up for %s', member.name)
+
+        else:
+            logger.warning('%s rate limited (%s), left out for %.0fs', member.name,
+                           reason or '429', self.cooldown)
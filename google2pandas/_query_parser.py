@@ -20,46 +20,16 @@ class QueryParser(object):
         # 1. Dates
         # The next two steps keep things consistent if the query is to be archived.
         try:
-            if query.get('start_date', '').endswith('daysAgo'):
-                ndays = int(re.sub(r'daysAgo', '', query.get('start_date')))
-                sday = pd.Timestamp('today') + pd.Timedelta(days=ndays)
-
-                query.update({
-                    'start_date' : sday.strftime('%Y-%m-%d')
-                })
-
-            elif query.get('start_date', '') == 'yesterday':
-                sday = pd.Timestamp('today') + pd.Timedelta(days=-1)
-
-                query.update({
-                    'start_date' : sday.strftime('%Y-%m-%d')
-                })
-
-            elif query.get('start_date', '') == 'today':
-                query.update({
-                    'start_date' : pd.Timestamp('today').strftime('%Y-%m-%d')
-                })
-                
-            else:
-                # force the formatting to a string YYYY-mm-dd
-                sday = pd.Timestamp(query.get('start_date')).strftime('%Y-%m-%d')
-                query.update({
-                    'start_date' : sday
-                })
+            query.update({
+                'start_date' : self.resolve_date(query.get('start_date', ''))
+            })
 
         except (KeyError, AttributeError) as e:
             raise ValueError('The (required) \'start_date\' parameter is missing or invalid')
 
-        if (query.get('end_date') is None) | (query.get('end_date') == 'today'):
-            query.update({
-                'end_date' : pd.Timestamp('today').strftime('%Y-%m-%d')
-            })
-
-        else:
-            eday = pd.Timestamp(query.get('end_date')).strftime('%Y-%m-%d')
-            query.update({
-                'end_date' : eday
-            })
+        query.update({
+            'end_date' : self.resolve_date(query.get('end_date') or 'today')
+        })
 
         # 2. Prefixing
         # Ensure that all fields that should be in the form 'prefix:XXXX' acutally are.
@@ -85,11 +55,11 @@ class QueryParser(object):
         
         # 3. Clean up the filtering if present
         _ = [self._maybe_add_filter_arg(query, n, d) \
-            for n, d in zip(['filters'], [query.get('filters', '')])]
+            for n, d in zip(['filters'], [query.get('filters')])]
 
         # 4. sorting
         _ = [self._maybe_add_sort_arg(query, n, d) \
-                for n, d in zip(['sort'], [query.get('sort', '')])]
+                for n, d in zip(['sort'], [query.get('sort')])]
 
         # 5. start_index, max_results
         if query.get('start_index') is not None:
@@ -115,7 +85,13 @@ class QueryParser(object):
                 'samplingLevel' : lvl
             })
 
-        # 7. Remove options that should not be there
+        # 7. fields
+        if query.get('fields') is not None:
+            query.update({
+                'fields' : self.check_fields(query.get('fields'))
+            })
+
+        # 8. Remove options that should not be there
         valid_params =  {
             'ids',
             'start_date',
@@ -147,12 +123,70 @@ class QueryParser(object):
         #
         # TODO:
         # Add fixes for:
-        # * fields
         # * userIp
         # * quotaUser
         
         return query
 
+    @staticmethod
+    def resolve_date(value):
+        '''
+        Resolve a GA date (YYYY-mm-dd, today, yesterday or NdaysAgo) to the
+        absolute date it currently designates, formatted as YYYY-mm-dd.
+        '''
+        today = pd.Timestamp('today')
+
+        if value == 'today':
+            day = today
+
+        elif value == 'yesterday':
+            day = today + pd.Timedelta(days=-1)
+
+        elif isinstance(value, str) and value.endswith('daysAgo'):
+            ndays = int(re.sub(r'daysAgo', '', value))
+            day = today + pd.Timedelta(days=-ndays)
+
+        else:
+            # force the formatting to a string YYYY-mm-dd
+            day = pd.Timestamp(value)
+
+        return day.strftime('%Y-%m-%d')
+
+    @staticmethod
+    def check_fields(fields):
+        '''
+        Check the format of a partial response selector ('fields' parameter),
+        given as a string or a list of field paths, e.g.
+
+            'columnHeaders,rows,nextLink'
+            ['reports/columnHeader', 'reports/data(rows,rowCount)']
+
+        Returns the selector as a single string.
+        '''
+        if isinstance(fields, (list, tuple)):
+            fields = ','.join(fields)
+
+        if not isinstance(fields, str):
+            raise ValueError(f'Malformed / invalid fields selector {fields!r}')
+
+        selector = re.sub(r'\s+', '', fields)
+
+        # field names (which may hold '-', e.g. 'start-date') or '*',
+        # separated by ',' and '/', with sub-selections in balanced
+        # parentheses
+        depth = 0
+        for char in selector:
+            depth += {'(' : 1, ')' : -1}.get(char, 0)
+
+            if depth < 0:
+                break
+
+        if depth != 0 or not re.fullmatch(r'[A-Za-z0-9_*/,()-]+', selector) or \
+                re.search(r'(^|[,/(])([,/()]|$)|\)[^,)]', selector):
+            raise ValueError(f'Malformed / invalid fields selector {fields!r}')
+
+        return selector
+
     def _maybe_add_arg(self, query, field, data):
         # Kludge to account for the fact that the same (GA) ids value is used
         # for different google products.
@@ -179,7 +213,7 @@ class QueryParser(object):
                 data = [data]
                 
             def _prefix(item):
-                if item[0] is '-':
+                if item[0] == '-':
                     if item[1:(d + 1)] == self.prefix:
                         return item
                         
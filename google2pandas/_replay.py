@@ -0,0 +1,231 @@
+import atexit
+import base64
+import datetime
+import gzip
+import httplib2
+import json
+import re
+import threading
+import time
+
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+archive_version = 1
+
+# replay latencies: as recorded, or none at all. A number scales the
+# recorded latencies.
+replay_latencies = ('original', 'zero')
+
+_iso_date = re.compile(r'(?<!\d)(\d{4})-(\d{2})-(\d{2})(?!\d)')
+
+
+def _shift_dates(text, days):
+    '''
+    Move every YYYY-mm-dd date in text (a URI or a request body) by days
+    '''
+    if not text:
+        return text
+
+    if isinstance(text, bytes):
+        return _shift_dates(text.decode('utf-8'), days).encode('utf-8')
+
+    def shift(match):
+        try:
+            day = datetime.date(*map(int, match.groups()))
+
+        except ValueError:
+            return match.group(0)
+
+        return (day + datetime.timedelta(days=days)).isoformat()
+
+    return _iso_date.sub(shift, text)
+
+
+def _request_key(method, uri, body):
+    '''
+    Key matching a replayed request to its recording: method, URI with
+    sorted parameters and canonical JSON body
+    '''
+    parts = urlsplit(uri)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    uri = urlunsplit(parts._replace(query=query))
+
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True)
+
+        except ValueError:
+            pass
+
+    return json.dumps([method.upper(), uri, body or None])
+
+
+class RecordingTransport(object):
+    '''
+    httplib2.Http like object forwarding every request to another transport
+    and recording each request / response pair, with its latency, to a
+    gzip compressed archive (one JSON object per line). Request headers are
+    not recorded, so the archive holds no credentials.
+
+    Replay the archive with ReplayTransport.
+    '''
+    def __init__(self, transport, path):
+        '''
+        Parameters:
+        -----------
+            transport : httplib2.Http like object
+                Carries (and authorizes) the requests.
+            path : str
+                Archive file name, overwritten if it exists.
+        '''
+        self.transport = transport
+        self.path = path
+        self.requests = 0
+
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._file.write(json.dumps({'version' : archive_version,
+                                     'created' : time.time()}) + '\n')
+
+        atexit.register(self.close)
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        '''
+        Same signature and return value as httplib2.Http.request
+        '''
+        start = time.perf_counter()
+
+        resp, content = self.transport.request(uri, method=method, body=body,
+                                               headers=headers,
+                                               redirections=redirections,
+                                               connection_type=connection_type)
+
+        entry = {
+            'key' : _request_key(method, uri, body),
+            'offset' : start - self._start,
+            'latency' : time.perf_counter() - start,
+            'headers' : dict(resp)
+        }
+
+        try:
+            entry['content'] = content.decode('utf-8')
+
+        except UnicodeDecodeError:
+            entry['content_b64'] = base64.b64encode(content).decode('ascii')
+
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(entry) + '\n')
+                self.requests += 1
+
+        return resp, content
+
+    def close(self):
+        '''
+        Finish writing the archive. The wrapped transport is left open.
+        '''
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayTransport(object):
+    '''
+    httplib2.Http like object answering requests from an archive written by
+    RecordingTransport, without network access or credentials.
+
+    Requests are matched on their method, URI and body. Identical requests
+    get the recorded responses in order, the last one being repeated once
+    they are used up, so an archive can be replayed any number of times.
+
+    Relative dates (e.g. '7daysAgo') are resolved before some requests are
+    sent, so a request matching no recording is looked up again with its
+    dates moved back by the days elapsed since the archive was recorded:
+    queries with relative dates replay on any later day.
+    '''
+    def __init__(self, path, latency='original'):
+        '''
+        Parameters:
+        -----------
+            path : str
+                Archive file name.
+            latency : str or float
+                'original' delays each response by its recorded latency,
+                'zero' answers at once and a number scales the recorded
+                latencies (e.g. 0.1). Default = 'original'
+        '''
+        if not isinstance(latency, (int, float)) and latency not in replay_latencies:
+            raise ValueError(f'Invalid latency \'{latency}\', use a number or one '
+                             f'of {", ".join(replay_latencies)}')
+
+        self.path = path
+        self.scale = {'original' : 1., 'zero' : 0.}.get(latency, latency)
+        self.requests = 0
+
+        self._responses = {}
+        self._lock = threading.Lock()
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+
+            if header.get('version') != archive_version:
+                raise ValueError(f'Unsupported archive version {header.get("version")}')
+
+            self.recorded = datetime.date.fromtimestamp(header['created'])
+
+            for line in f:
+                entry = json.loads(line)
+                self._responses.setdefault(entry['key'], deque()).append(entry)
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        '''
+        Same signature and return value as httplib2.Http.request
+        '''
+        key = _request_key(method, uri, body)
+        shift = (datetime.date.today() - self.recorded).days
+
+        with self._lock:
+            queue = self._responses.get(key)
+
+            # the same query, with its relative dates resolved on the day
+            # of the recording
+            if not queue and shift:
+                queue = self._responses.get(_request_key(method,
+                    _shift_dates(uri, -shift), _shift_dates(body, -shift)))
+
+            if not queue:
+                note = f' (nor with its dates moved back {shift} days, to the ' \
+                       f'day of the recording)' if shift else ''
+
+                raise ValueError(f'No recorded response for {method} {uri}{note}')
+
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.requests += 1
+
+        if self.scale:
+            time.sleep(entry['latency'] * self.scale)
+
+        if 'content' in entry:
+            content = entry['content'].encode('utf-8')
+
+        else:
+            content = base64.b64decode(entry['content_b64'])
+
+        return httplib2.Response(entry['headers']), content
+
+    def close(self):
+        pass
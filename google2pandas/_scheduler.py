@@ -0,0 +1,365 @@
+import datetime
+import json
+import random
+import threading
+import time
+
+from contextlib import contextmanager
+
+# GA answers these with 403 (or 429) when a request may simply be retried
+# later. 'quotaExceeded' is the limit on concurrent requests per view.
+retry_reasons = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded',
+                 'backendError', 'internalServerError')
+retry_statuses = (429, 500, 502, 503, 504)
+
+# Default (documented) GA quotas, per project and per view. Projects with
+# raised limits should pass their own to Scheduler.
+default_limits = {
+    'v3' : {'qps' : 10, 'daily' : 50000, 'view_daily' : 10000,
+            'concurrency' : 10, 'view_concurrency' : 10},
+    'v4' : {'qps' : 20, 'daily' : 50000, 'view_daily' : 10000,
+            'concurrency' : 10, 'view_concurrency' : 10}
+}
+
+# schedulers shared by every query object in the process, see shared_scheduler
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class QuotaExhausted(RuntimeError):
+    '''
+    Raised instead of sending a request once a daily quota is used up
+    '''
+    pass
+
+
+def _quota_day():
+    # GA daily quotas are reset at midnight Pacific time
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo('America/Los_Angeles')
+
+    except Exception:
+        tz = datetime.timezone.utc
+
+    return datetime.datetime.now(tz).date()
+
+
+class TokenBucket(object):
+    '''
+    Thread-safe token bucket: 'rate' tokens per second are added, up to
+    'capacity'. Tokens are reserved ahead of time (the balance may go
+    negative), so that waiting callers are served in order.
+    '''
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost=1):
+        '''
+        Take cost tokens and return the number of seconds to wait before
+        using them
+        '''
+        with self._lock:
+            self._refill()
+            self._tokens -= cost
+
+            return max(-self._tokens / self.rate, 0.)
+
+    def pause(self, seconds):
+        '''
+        Hand out no tokens for (at least) the given number of seconds
+        '''
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.) - seconds * self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._stamp) * self.rate,
+                           self.capacity)
+        self._stamp = now
+
+
+class DailyQuota(object):
+    '''
+    Thread-safe count of the requests made on the current (Pacific time) day
+    '''
+    def __init__(self, limit, name):
+        self.limit = limit
+        self.name = name
+
+        self._day = None
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def take(self, cost=1):
+        with self._lock:
+            day = _quota_day()
+            if day != self._day:
+                self._day, self._used = day, 0
+
+            if self._used + cost > self.limit:
+                raise QuotaExhausted(f'Daily quota of {self.limit} requests '
+                                     f'used up for {self.name}')
+
+            self._used += cost
+
+    def used(self):
+        '''
+        Number of requests made on the current day
+        '''
+        with self._lock:
+            return self._used if self._day == _quota_day() else 0
+
+
+class Scheduler(object):
+    '''
+    Schedules the API calls of every query object sharing it.
+
+    Before each call, tokens are taken from the per-project bucket (QPS)
+    and the daily quotas of the project and of the view queried. Calls run
+    inside a concurrency governor (overall and per view), shared by the
+    concurrent page fetches, shards and batches of all query objects.
+    Calls failing with a retryable error (rate limits, 5xx, connection
+    errors) are retried with jittered exponential backoff; on rate limit
+    errors the whole project is slowed down, not only the failing call.
+    '''
+    def __init__(self,
+                 qps=10,
+                 burst=None,
+                 daily=50000,
+                 view_qps=None,
+                 view_daily=10000,
+                 concurrency=10,
+                 view_concurrency=10,
+                 retries=5,
+                 backoff=1.,
+                 max_backoff=64.):
+        '''
+        Parameters:
+        -----------
+            qps : float
+                Sustained requests per second for the project. None disables
+                the limit. Default = 10
+            burst : int
+                Requests that may be sent at once after an idle period.
+                Default = qps
+            daily : int
+                Requests per day for the project. None disables the limit.
+                Default = 50000
+            view_qps : float
+                Sustained requests per second for each view. Default = None
+            view_daily : int
+                Requests per day for each view. Default = 10000
+            concurrency : int
+                Maximum number of requests in flight. Default = 10
+            view_concurrency : int
+                Maximum number of requests in flight per view. Default = 10
+            retries : int
+                Number of times a call is retried. Default = 5
+            backoff : float
+                Base of the exponential backoff, in seconds. Default = 1
+            max_backoff : float
+                Maximum delay between retries, in seconds. Default = 64
+        '''
+        self.retries = retries
+        self.backoff_base = backoff
+        self.max_backoff = max_backoff
+
+        self._bucket = TokenBucket(qps, burst) if qps else None
+        self._daily = DailyQuota(daily, 'the project') if daily else None
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+        self._view_qps = view_qps
+        self._view_daily = view_daily
+        self._view_concurrency = view_concurrency
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def call(self, fn, view=None, cost=1):
+        '''
+        Call fn() (typically the execute method of a google api request)
+        once its turn has come, retrying it on retryable errors.
+
+        Parameters:
+        -----------
+            fn : callable
+            view : str
+                View (profile) the request queries, if known.
+            cost : int
+                Number of requests fn() counts as. Default = 1
+        '''
+        attempt = 0
+
+        while True:
+            time.sleep(self.reserve(view, cost))
+
+            try:
+                with self.slot(view):
+                    return fn()
+
+            except Exception as e:
+                status, reason = _error_details(e)
+
+                if attempt >= self.retries or not self.retryable(status, reason, e):
+                    raise
+
+            delay = self.backoff(attempt)
+            if status == 429 or reason in retry_reasons[:3]:
+                self.throttle(view, delay)
+
+            time.sleep(delay)
+            attempt += 1
+
+    def reserve(self, view=None, cost=1):
+        '''
+        Take cost requests from the daily quotas and the rate limits of the
+        project and view. Returns the number of seconds to wait before
+        sending the request(s).
+        '''
+        bucket, daily, _ = self._view(view)
+
+        if self._daily is not None:
+            self._daily.take(cost)
+
+        if daily is not None:
+            daily.take(cost)
+
+        wait = 0.
+        for b in (self._bucket, bucket):
+            if b is not None:
+                wait = max(wait, b.reserve(cost))
+
+        return wait
+
+    @contextmanager
+    def slot(self, view=None):
+        '''
+        Hold a place in the concurrency governor (overall and for view)
+        '''
+        self.acquire(view)
+
+        try:
+            yield
+
+        finally:
+            self.release(view)
+
+    def acquire(self, view=None, blocking=True):
+        '''
+        Take a place in the concurrency governor (overall and for view), to
+        be given back with release. Without blocking, returns False (and
+        takes nothing) if no place is free.
+        '''
+        _, _, slots = self._view(view)
+
+        if not self._slots.acquire(blocking):
+            return False
+
+        if slots is not None and not slots.acquire(blocking):
+            self._slots.release()
+            return False
+
+        return True
+
+    def release(self, view=None):
+        _, _, slots = self._view(view)
+
+        if slots is not None:
+            slots.release()
+
+        self._slots.release()
+
+    def throttle(self, view=None, seconds=1.):
+        '''
+        Send no new requests to the project (and view) for a while
+        '''
+        bucket, _, _ = self._view(view)
+
+        for b in (self._bucket, bucket):
+            if b is not None:
+                b.pause(seconds)
+
+    def backoff(self, attempt):
+        '''
+        Delay before retry number attempt (0 based): exponential, with full
+        jitter so that concurrent callers do not retry in lock step.
+        '''
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def retryable(status=None, reason=None, error=None):
+        '''
+        Whether a call failing with the given HTTP status / GA error reason
+        (or the given exception) may be retried
+        '''
+        if reason in retry_reasons or status in retry_statuses:
+            return True
+
+        # dropped connections, time outs...
+        return status is None and isinstance(error, OSError)
+
+    def _view(self, view):
+        if view is None:
+            return None, None, None
+
+        with self._lock:
+            state = self._views.get(view)
+
+            if state is None:
+                state = self._views[view] = (
+                    TokenBucket(self._view_qps) if self._view_qps else None,
+                    DailyQuota(self._view_daily, f'view {view}') \
+                        if self._view_daily else None,
+                    threading.BoundedSemaphore(self._view_concurrency) \
+                        if self._view_concurrency else None
+                )
+
+            return state
+
+
+def _error_details(error):
+    '''
+    HTTP status and GA error reason of a googleapiclient HttpError (or any
+    exception carrying a 'resp' and its 'content')
+    '''
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    reason = error_reason(getattr(error, 'content', None))
+
+    return (int(status) if status is not None else None), reason
+
+
+def error_reason(content):
+    '''
+    GA error reason (e.g. 'rateLimitExceeded') of an error response body,
+    None if there is none
+    '''
+    try:
+        content = json.loads(content)['error']
+        errors = content.get('errors') or [{}]
+
+        return errors[0].get('reason') or content.get('status')
+
+    except Exception:
+        return None
+
+
+def shared_scheduler(key, api='v4'):
+    '''
+    Return the process-wide Scheduler object for key (typically the secrets
+    file, i.e. the project), created with the default limits of api if
+    needed.
+    '''
+    with _shared_lock:
+        scheduler = _shared.get((key, api))
+
+        if scheduler is None:
+            scheduler = _shared[(key, api)] = Scheduler(**default_limits[api])
+
+        return scheduler
@@ -0,0 +1,87 @@
+import pandas as pd
+
+from ._dtypes import concat_frames
+
+# Shard sizes and the matching pandas period frequencies
+shard_freqs = {
+    'day'   : 'D',
+    'week'  : 'W',
+    'month' : 'M'
+}
+
+
+def date_shards(start_date, end_date, freq='month'):
+    '''
+    Split the (inclusive) date range start_date - end_date into consecutive
+    shards aligned on calendar days, weeks or months.
+
+    Parameters:
+    -----------
+        start_date, end_date : str
+            Absolute dates, as produced by QueryParser.parse
+        freq : str
+            One of 'day', 'week' or 'month'. Default = 'month'
+
+    Returns:
+    -----------
+        shards : list
+            (start_date, end_date) pairs formatted as YYYY-mm-dd.
+    '''
+    try:
+        period = shard_freqs[freq]
+
+    except KeyError:
+        raise ValueError(f'Invalid shard frequency \'{freq}\', use one of '
+                         f'{", ".join(shard_freqs)}')
+
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+
+    shards = []
+    for p in pd.period_range(start, end, freq=period):
+        sday = max(p.start_time.normalize(), start)
+        eday = min(p.end_time.normalize(), end)
+
+        shards.append((sday.strftime('%Y-%m-%d'), eday.strftime('%Y-%m-%d')))
+
+    return shards
+
+
+def merge_shards(frames, dimensions, aggregate=False):
+    '''
+    Combine the frames obtained for each shard into one.
+
+    Parameters:
+    -----------
+        frames : list
+            pandas.DataFrame objects, in shard order.
+        dimensions : list
+            Names of the dimension columns; every other column is a metric.
+        aggregate : Boolean or list
+            Re-aggregate the metrics over the dimensions, so that rows which
+            were split across shards are summed back together. Only valid
+            for additive metrics (sessions, pageviews, ...). A list limits
+            the aggregation to the given metrics, the others are dropped.
+            Default = False
+
+    Returns:
+    -----------
+        df : pandas.DataFrame
+    '''
+    df = concat_frames(frames)
+
+    if not aggregate or not len(df.columns):
+        return df
+
+    if aggregate is True:
+        metrics = [c for c in df.columns if c not in dimensions]
+
+    else:
+        metrics = [m.replace('ga:', '') for m in aggregate]
+
+    dims = [d for d in dimensions if d in df.columns]
+
+    if not dims:
+        return df[metrics].sum().to_frame().T
+
+    return df.groupby(dims, sort=False, as_index=False, observed=True)[metrics].sum()
@@ -0,0 +1,115 @@
+import os
+
+sink_formats = ('parquet', 'arrow')
+
+
+def _import_pyarrow():
+    '''
+    pyarrow is an optional dependency, only needed when writing to disk.
+    '''
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+    except ImportError:
+        raise ImportError('Writing query results to parquet or arrow files '
+                          'requires pyarrow (pip install pyarrow)')
+
+    return pa, pq
+
+
+class FrameWriter(object):
+    '''
+    Incrementally write a stream of pandas.DataFrame objects (typically one
+    per API page) to a single parquet or Arrow IPC file. Every frame becomes
+    a parquet row group or an Arrow record batch as soon as it is written,
+    so the complete result never has to be held in memory.
+
+    The schema is fixed by the first frame written; subsequent frames are
+    cast to it.
+    '''
+    def __init__(self, path, format='parquet'):
+        '''
+        Parameters:
+        -----------
+            path : str
+                Output file name.
+            format : str
+                Either 'parquet' or 'arrow' (Arrow IPC file format, which can
+                be memory-mapped by the reader). Default = 'parquet'
+        '''
+        if format not in sink_formats:
+            raise ValueError(f'Invalid format \'{format}\', use one of '
+                             f'{", ".join(sink_formats)}')
+
+        self.path = path
+        self.format = format
+        self.schema = None
+        self.rows = 0
+
+        self._pa, self._pq = _import_pyarrow()
+        self._writer = None
+
+    def write(self, df):
+        '''
+        Append df to the output file.
+        '''
+        pa = self._pa
+
+        if self._writer is None:
+            self._open(df)
+
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _open(self, df):
+        pa = self._pa
+
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+        for i, field in enumerate(schema):
+            # columns of an empty first page carry no type information, the
+            # only columns that can end up that way are the string ones
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, field.with_type(pa.string()))
+
+            elif pa.types.is_dictionary(field.type):
+                value_type = field.type.value_type
+                if pa.types.is_null(value_type):
+                    value_type = pa.string()
+
+                # the categories (hence the index width) differ between
+                # pages. Parquet dictionary-encodes each row group anyway;
+                # Arrow IPC files can not replace a dictionary once written,
+                # so categoricals are stored as plain values there.
+                if self.format == 'parquet':
+                    dtp = pa.dictionary(pa.int32(), value_type)
+
+                else:
+                    dtp = value_type
+
+                schema = schema.set(i, field.with_type(dtp))
+
+        self.schema = schema
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        if self.format == 'parquet':
+            self._writer = self._pq.ParquetWriter(self.path, self.schema)
+
+        else:
+            self._writer = pa.ipc.new_file(self.path, self.schema)
@@ -0,0 +1,185 @@
+import os
+import re
+import tempfile
+import weakref
+
+from ._dtypes import FrameBuilder
+from ._sinks import FrameWriter, _import_pyarrow
+
+_size_units = {'' : 1, 'B' : 1, 'KB' : 10**3, 'MB' : 10**6, 'GB' : 10**9,
+               'KIB' : 2**10, 'MIB' : 2**20, 'GIB' : 2**30}
+
+_size_format = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*$')
+
+
+def parse_size(size):
+    '''
+    Number of bytes of size, given as a number or a string such as '512MB'
+    or '2GiB'
+    '''
+    if isinstance(size, (int, float)):
+        value, unit = size, ''
+
+    else:
+        match = _size_format.match(str(size))
+        value, unit = (match.group(1), match.group(2).upper()) if match else (None, None)
+
+    if unit not in _size_units or float(value) <= 0:
+        raise ValueError(f'Invalid memory size {size!r}, use a number of bytes '
+                         f'or e.g. \'512MB\', \'2GiB\'')
+
+    return int(float(value) * _size_units[unit])
+
+
+def _remove(source, path):
+    source.close()
+
+    try:
+        os.remove(path)
+
+    except OSError:
+        pass
+
+
+class SpilledFrame(object):
+    '''
+    Handle on a result spilled to disk (see memory_limit): an Arrow IPC
+    file, memory-mapped and only loaded as it is read. The file is removed
+    once the handle is closed or garbage collected.
+
+    String dimensions are stored as plain values on disk and come back as
+    categoricals (when the query object stores them so).
+    '''
+    def __init__(self, path, rows, categories=(), delete=True):
+        pa, _ = _import_pyarrow()
+
+        self.path = path
+        self.rows = rows
+        self.categories = list(categories)
+
+        self._source = pa.memory_map(path, 'r')
+        self._reader = pa.ipc.open_file(self._source)
+        self._finalizer = weakref.finalize(self, _remove, self._source, path) \
+            if delete else None
+
+    @property
+    def columns(self):
+        return self._reader.schema.names
+
+    @property
+    def table(self):
+        '''
+        The whole result as a pyarrow.Table, whose buffers point into the
+        memory-mapped file (no copy)
+        '''
+        return self._reader.read_all()
+
+    def to_pandas(self, columns=None):
+        '''
+        Load the result (or the given columns) as a pandas.DataFrame object
+        '''
+        table = self.table
+
+        if columns is not None:
+            table = table.select(columns)
+
+        return self._to_pandas(table)
+
+    def iter_frames(self):
+        '''
+        Iterate over the result one spilled chunk at a time, as
+        pandas.DataFrame objects
+        '''
+        for i in range(self._reader.num_record_batches):
+            yield self._to_pandas(self._reader.get_batch(i))
+
+    def close(self):
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __len__(self):
+        return self.rows
+
+    def __repr__(self):
+        return f'SpilledFrame({self.path!r}, rows={self.rows}, columns={self.columns})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _to_pandas(self, data):
+        categories = [c for c in self.categories if c in data.schema.names]
+
+        return data.to_pandas(categories=categories)
+
+
+class SpillingBuilder(object):
+    '''
+    FrameBuilder holding at most (about) limit bytes of converted pages.
+    Beyond that, the pages held are written out as one record batch of a
+    temporary Arrow IPC file, and the result comes back as a SpilledFrame
+    instead of a pandas.DataFrame. The dictionaries of the interner stay in
+    memory.
+    '''
+    def __init__(self, limit, strings='category', interner=None, dir=None):
+        '''
+        Parameters:
+        -----------
+            limit : int or str
+                Memory budget of the converted pages, in bytes or as e.g.
+                '512MB'.
+            strings : str
+                Storage of the string dimensions, see to_column.
+            interner : Interner
+                Dictionaries to encode categorical columns with.
+            dir : str
+                Directory of the temporary file. Default = the system's
+                temporary directory (TMPDIR)
+        '''
+        self.limit = parse_size(limit)
+        self.dir = dir
+        self.path = None
+
+        self._builder = FrameBuilder(strings, interner)
+        self._writer = None
+        self._categorical = set()
+
+    def append(self, columns):
+        self._builder.append(columns)
+
+        if self._builder.nbytes >= self.limit:
+            self._spill()
+
+    def frame(self):
+        '''
+        The pandas.DataFrame of every page appended, if they fit within the
+        limit, else a SpilledFrame
+        '''
+        if self._writer is None:
+            return self._builder.frame()
+
+        if self._builder.rows:
+            self._spill()
+
+        self._writer.close()
+
+        return SpilledFrame(self.path, self._writer.rows,
+                            categories=self._categorical)
+
+    def _spill(self):
+        if self._writer is None:
+            fd, self.path = tempfile.mkstemp(prefix='google2pandas-',
+                                             suffix='.arrow', dir=self.dir)
+            os.close(fd)
+
+            self._writer = FrameWriter(self.path, 'arrow')
+
+            print(f'Result over the memory limit, spilling pages to {self.path}')
+
+        builder = self._builder
+        self._writer.write(builder.frame())
+        self._categorical |= builder._categorical
+
+        self._builder = FrameBuilder(builder.strings, builder.interner)
@@ -0,0 +1,137 @@
+import httplib2
+import threading
+
+from collections import deque
+
+from ._credentials import SharedCredentials
+
+default_pool_size = 10
+
+# transports shared by every query object in the process, see shared_transport
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class PooledHttp(object):
+    '''
+    Thread-safe replacement for an authorized httplib2.Http object.
+
+    httplib2.Http objects hold a single (keep-alive) connection per host and
+    can not be used by several threads at once. This class keeps a pool of
+    them, lending one to each request, so that up to 'size' requests can run
+    concurrently while connections are reused between requests.
+
+    Authorization headers are added from the credentials (see
+    _credentials.SharedCredentials), which refresh their token ahead of its
+    expiry and coordinate refreshes between threads.
+    '''
+    def __init__(self, credentials=None, size=default_pool_size, timeout=None):
+        '''
+        Parameters:
+        -----------
+            credentials : SharedCredentials or oauth2client credentials
+                Used to authorize every request. None sends requests as is.
+            size : int
+                Maximum number of connections (and concurrent requests).
+                Default = 10
+            timeout : float
+                Socket timeout (in seconds) of the connections.
+        '''
+        if credentials is not None and not isinstance(credentials, SharedCredentials):
+            credentials = SharedCredentials(credentials)
+
+        self.credentials = credentials
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        '''
+        Same signature and return value as httplib2.Http.request
+        '''
+        headers = dict(headers or {})
+        token = self._authorize(headers)
+
+        resp, content = self._request(uri, method, body, headers,
+                                      redirections, connection_type)
+
+        # token revoked or expired early: refresh once and retry
+        if resp.status == 401 and self.credentials is not None:
+            self.credentials.refresh(token)
+            self._authorize(headers)
+
+            resp, content = self._request(uri, method, body, headers,
+                                          redirections, connection_type)
+
+        return resp, content
+
+    def close(self):
+        '''
+        Close the idle connections of the pool
+        '''
+        for http in list(self._idle):
+            http.close()
+
+    def _request(self, uri, method, body, headers, redirections, connection_type):
+        http = self._acquire()
+
+        try:
+            return http.request(uri, method=method, body=body, headers=headers,
+                                redirections=redirections,
+                                connection_type=connection_type)
+
+        finally:
+            self._release(http)
+
+    def _acquire(self):
+        self._slots.acquire()
+
+        try:
+            return self._idle.pop()
+
+        except IndexError:
+            return httplib2.Http(timeout=self.timeout)
+
+    def _release(self, http):
+        # most recently used first, those connections are the most likely
+        # to still be alive
+        self._idle.append(http)
+        self._slots.release()
+
+    def _authorize(self, headers):
+        '''
+        Add the authorization header, refreshing the token first if needed.
+        Returns the token used.
+        '''
+        if self.credentials is None:
+            return None
+
+        token = self.credentials.token()
+        headers['Authorization'] = f'Bearer {token}'
+
+        return token
+
+
+def shared_transport(key, credentials, size=default_pool_size):
+    '''
+    Return the process-wide PooledHttp object for key (typically the
+    credentials file and scope), creating it from credentials if needed.
+    '''
+    with _shared_lock:
+        transport = _shared.get(key)
+
+        if transport is None:
+            transport = _shared[key] = PooledHttp(credentials, size=size)
+
+        return transport
+
+
+def is_shared(transport):
+    '''
+    Whether transport is one of the process-wide PooledHttp objects
+    '''
+    with _shared_lock:
+        return any(t is transport for t in _shared.values())
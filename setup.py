@@ -31,10 +31,13 @@ metadata = {\
     'license'           : 'MIT LICENCE',
     'install_requires'  : [
                             'numpy>=1.19',
-                            'pandas>=1.1',
+                            'pandas>=1.3',
                             'google-api-python-client',
                             'httplib2',
                             'oauth2client'],
+    'extras_require'    : {
+                            'arrow' : ['pyarrow'],
+                            'async' : ['aiohttp']},
     'packages'          : find_packages()}
 
 setup(**metadata)
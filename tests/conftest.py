@@ -0,0 +1,175 @@
+import datetime
+import json
+import os
+import sys
+
+from urllib.parse import parse_qs, urlparse
+
+import httplib2
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the package from this checkout, and the synthetic GA responses of the
+# benchmarks (FakeTransport, SyntheticReport)
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+from google2pandas import Scheduler
+from synthetic import FakeTransport, SyntheticReport
+
+
+def unlimited_scheduler(**kwargs):
+    # no rate limits nor quotas, quick retries
+    limits = dict(qps=None, daily=None, view_daily=None, concurrency=64,
+                  view_concurrency=None, backoff=0.001)
+    limits.update(kwargs)
+
+    return Scheduler(**limits)
+
+
+def v3_query(report, **kwargs):
+    query = {
+        'ids' : 'ga:1',
+        'start_date' : '2024-01-01',
+        'end_date' : '2024-12-31',
+        'metrics' : [m for m, _ in report.metrics],
+        'dimensions' : report.dimensions,
+        'max_results' : report.page_size
+    }
+    query.update(kwargs)
+
+    return query
+
+
+def v4_query(report, **kwargs):
+    request = {
+        'viewId' : '1',
+        'dateRanges' : [{'startDate' : '2024-01-01', 'endDate' : '2024-12-31'}],
+        'dimensions' : [{'name' : f'ga:{d}'} for d in report.dimensions],
+        'metrics' : [{'expression' : f'ga:{m}'} for m, _ in report.metrics],
+        'pageSize' : report.page_size
+    }
+    request.update(kwargs)
+
+    return {'reportRequests' : [request]}
+
+
+class DateTransport(object):
+    '''
+    httplib2.Http like object answering V3 and V4 queries on the 'date' and
+    'source' dimensions with two rows per day of the requested range:
+    ('a', 1) and ('b', day of the month). Without the 'date' dimension the
+    sessions are summed per source. Records the date ranges asked for.
+    '''
+    page_size = 10
+
+    def __init__(self):
+        self.ranges = []
+
+    def rows(self, start_date, end_date, dates=True):
+        days = []
+        day = datetime.date.fromisoformat(start_date)
+
+        while day <= datetime.date.fromisoformat(end_date):
+            days.append(day)
+            day += datetime.timedelta(days=1)
+
+        if not dates:
+            return [['a', str(len(days))], ['b', str(sum(d.day for d in days))]]
+
+        return [[d.strftime('%Y%m%d'), s, str(v)] for d in days \
+            for s, v in (('a', 1), ('b', d.day))]
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        url = urlparse(uri)
+
+        if url.path.endswith('/data/ga'):
+            query = {k : v[0] for k, v in parse_qs(url.query).items()}
+            content = self._v3(query)
+
+        else:
+            content = {'reports' : [self._v4(r) for r in json.loads(body)['reportRequests']]}
+
+        return httplib2.Response({'status' : 200}), json.dumps(content).encode()
+
+    def close(self):
+        pass
+
+    def _v3(self, query):
+        start, end = query['start-date'], query['end-date']
+        first = int(query.get('start-index', 1))
+        size = int(query.get('max-results', self.page_size))
+
+        if first == 1:
+            self.ranges.append((start, end))
+
+        dates = 'ga:date' in query.get('dimensions', '')
+        dimensions = ['ga:date', 'ga:source'] if dates else ['ga:source']
+        rows = self.rows(start, end, dates)
+        page = {
+            'itemsPerPage' : size,
+            'totalResults' : len(rows),
+            'columnHeaders' : [{'name' : d, 'columnType' : 'DIMENSION',
+                                'dataType' : 'STRING'} for d in dimensions] + \
+                [{'name' : 'ga:sessions', 'columnType' : 'METRIC', 'dataType' : 'INTEGER'}],
+            'rows' : rows[first - 1:first - 1 + size]
+        }
+
+        if first - 1 + size < len(rows):
+            page['nextLink'] = f'https://www.googleapis.com/analytics/v3/data/ga?' \
+                f'start-index={first + size}&max-results={size}'
+
+        return page
+
+    def _v4(self, request):
+        rng = request['dateRanges'][0]
+        offset = int(request.get('pageToken') or 0)
+        size = int(request.get('pageSize', self.page_size))
+
+        if not offset:
+            self.ranges.append((rng['startDate'], rng['endDate']))
+
+        dimensions = [d['name'] for d in request.get('dimensions', [])]
+        dates = 'ga:date' in dimensions
+        rows = self.rows(rng['startDate'], rng['endDate'], dates)
+        report = {
+            'columnHeader' : {
+                'dimensions' : ['ga:date', 'ga:source'] if dates else ['ga:source'],
+                'metricHeader' : {'metricHeaderEntries' : \
+                    [{'name' : 'ga:sessions', 'type' : 'INTEGER'}]}},
+            'data' : {'rows' : [{'dimensions' : r[:-1], 'metrics' : [{'values' : r[-1:]}]} \
+                for r in rows[offset:offset + size]]}
+        }
+
+        if offset + size < len(rows):
+            report['nextPageToken'] = str(offset + size)
+
+        return report
+
+
+def date_query_v3(start_date, end_date, dimensions=('date', 'source')):
+    return {'ids' : 'ga:1', 'start_date' : start_date, 'end_date' : end_date,
+            'metrics' : ['sessions'], 'dimensions' : list(dimensions),
+            'max_results' : DateTransport.page_size}
+
+
+def date_query_v4(start_date, end_date, dimensions=('date', 'source')):
+    return {'reportRequests' : [{
+        'viewId' : '1',
+        'dateRanges' : [{'startDate' : start_date, 'endDate' : end_date}],
+        'dimensions' : [{'name' : f'ga:{d}'} for d in dimensions],
+        'metrics' : [{'expression' : 'ga:sessions'}],
+        'pageSize' : DateTransport.page_size
+    }]}
+
+
+@pytest.fixture
+def report():
+    return SyntheticReport(rows=600, dimensions=3, metrics=4, cardinality=40,
+                           pages=3, seed=1)
+
+
+@pytest.fixture
+def transport(report):
+    return FakeTransport(report)
@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from aiohttp import web
+
+from google2pandas import AsyncGoogleAnalyticsQueryV4, GoogleAnalyticsQueryV4
+from conftest import unlimited_scheduler, v4_query
+
+
+class StubServer(object):
+    '''
+    Local batchGet endpoint forwarding the request bodies to an httplib2 like
+    transport. Queued faults are served before the real answers: 'drop'
+    closes the connection, an int is returned as an error status.
+    '''
+    def __init__(self, transport, faults=(), delay=0.):
+        self.transport = transport
+        self.faults = list(faults)
+        self.delay = delay
+        self.calls = 0
+        self.bodies = []
+        self.inflight = 0
+        self.max_inflight = 0
+
+    async def handler(self, request):
+        self.calls += 1
+
+        if self.faults:
+            fault = self.faults.pop(0)
+
+            if fault == 'drop':
+                request.transport.close()
+                return web.Response()
+
+            reason = 'rateLimitExceeded' if fault == 429 else \
+                'backendError' if fault >= 500 else 'badRequest'
+
+            return web.json_response({'error' : {'code' : fault,
+                'errors' : [{'reason' : reason}]}}, status=fault)
+
+        body = await request.text()
+        self.bodies.append(json.loads(body))
+
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+
+        try:
+            await asyncio.sleep(self.delay)
+
+        finally:
+            self.inflight -= 1
+
+        resp, content = self.transport.request(str(request.url), 'POST', body)
+
+        return web.Response(body=content, status=resp.status,
+                            content_type='application/json')
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post('/v4/reports:batchGet', self.handler)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.endpoint = f'http://127.0.0.1:{port}/v4/reports:batchGet'
+
+        return self
+
+    async def __aexit__(self, *args):
+        await self._runner.cleanup()
+
+
+def run(transport, call, faults=(), delay=0., **kwargs):
+    '''
+    Run call(conn) against a stub server, returns (result, server)
+    '''
+    kwargs.setdefault('scheduler', unlimited_scheduler())
+
+    async def main():
+        async with StubServer(transport, faults, delay) as server:
+            async with AsyncGoogleAnalyticsQueryV4(secrets=None,
+                    endpoint=server.endpoint, **kwargs) as conn:
+                return await call(conn), server
+
+    return asyncio.run(main())
+
+
+def sync_frame(transport, query):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+
+    return conn.execute_query(query)
+
+
+def test_pagination_matches_sync_reader(report, transport):
+    query = v4_query(report)
+    df, server = run(transport, lambda conn: conn.execute_query(query))
+
+    assert server.calls == report.pages
+    assert [b['reportRequests'][0].get('pageToken') for b in server.bodies][1:] == \
+        [str(i * report.page_size) for i in range(1, report.pages)]
+    assert len(df) == report.rows
+
+    pd.testing.assert_frame_equal(df, sync_frame(transport, query))
+
+    # the callers query is left without page tokens
+    assert 'pageToken' not in query['reportRequests'][0]
+
+
+def test_first_page_only(report, transport):
+    df, server = run(transport, lambda conn: conn.execute_query(v4_query(report),
+                                                                all_results=False))
+
+    assert server.calls == 1
+    assert len(df) == report.page_size
+
+
+def test_as_dict(report, transport):
+    out, server = run(transport, lambda conn: conn.execute_query(v4_query(report),
+                                                                 as_dict=True))
+
+    assert len(out['reports']) == report.pages
+    assert sum(len(r['data']['rows']) for r in out['reports']) == report.rows
+
+
+@pytest.mark.parametrize('faults', [[503], [429, 'drop'], ['drop', 'drop']])
+def test_retries(report, transport, faults):
+    query = v4_query(report)
+    df, server = run(transport, lambda conn: conn.execute_query(query), faults)
+
+    assert server.calls == report.pages + len(faults)
+    pd.testing.assert_frame_equal(df, sync_frame(transport, query))
+
+
+def test_client_errors_are_raised(report, transport):
+    with pytest.raises(aiohttp.ClientResponseError) as err:
+        run(transport, lambda conn: conn.execute_query(v4_query(report)), [400])
+
+    assert err.value.status == 400
+
+
+def test_retries_give_up(report, transport):
+    with pytest.raises(aiohttp.ClientResponseError) as err:
+        run(transport, lambda conn: conn.execute_query(v4_query(report)), [503] * 3,
+            scheduler=unlimited_scheduler(retries=2))
+
+    assert err.value.status == 503
+
+
+def test_execute_many_shares_categories(report, transport):
+    requests = [v4_query(report)['reportRequests'][0] for _ in range(3)]
+    frames, server = run(transport, lambda conn: conn.execute_many(requests))
+
+    assert [len(f) for f in frames] == [report.rows] * 3
+
+    # packed in one batchGet call per page
+    assert server.calls == report.pages
+
+    dimension = report.dimensions[-1]
+    for f in frames[1:]:
+        assert list(f[dimension].cat.categories) == \
+            list(frames[0][dimension].cat.categories)
+
+
+def test_view_concurrency(report, transport):
+    # requests on distinct date ranges are not packed together: the groups
+    # run concurrently, but on the same view
+    requests = [dict(v4_query(report)['reportRequests'][0],
+                     dateRanges=[{'startDate' : f'2024-0{i + 1}-01', 'endDate' : '2024-12-31'}]) \
+        for i in range(4)]
+    scheduler = unlimited_scheduler(view_concurrency=1)
+
+    frames, server = run(transport, lambda conn: conn.execute_many(requests),
+        delay=0.02, scheduler=scheduler)
+
+    assert server.calls == len(requests) * report.pages
+    assert server.max_inflight == 1
@@ -0,0 +1,146 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4, QueryCache
+from conftest import unlimited_scheduler, v3_query, v4_query
+
+
+@pytest.fixture
+def frame():
+    df = pd.DataFrame({'source' : ['a', 'b', None, 'a'], 'sessions' : [1, 2, 3, 4]})
+    df['source'] = df['source'].astype('category')
+    df['sessions'] = df['sessions'].astype('UInt32')
+    df['date'] = pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03', None])
+
+    return df
+
+
+@pytest.mark.parametrize('format', ['arrow', 'pickle'])
+def test_round_trips(tmp_path, frame, format):
+    cache = QueryCache(str(tmp_path), format=format)
+    meta = {'totalResults' : 4, 'query' : {'ids' : 'ga:1'}}
+
+    cache.set('frame', frame)
+    cache.set('pair', (frame, meta))
+    cache.set('dict', {'reports' : [meta]})
+
+    pd.testing.assert_frame_equal(cache.get('frame'), frame)
+
+    df, res = cache.get('pair')
+    pd.testing.assert_frame_equal(df, frame)
+    assert res == meta
+
+    assert cache.get('dict') == {'reports' : [meta]}
+    assert cache.get('missing') is None
+
+
+def test_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        QueryCache(str(tmp_path), format='csv')
+
+
+def test_corrupt_entry_is_a_miss(tmp_path, frame):
+    cache = QueryCache(str(tmp_path))
+    cache.set('key', frame)
+
+    with open(cache._file('key'), 'wb') as f:
+        f.write(b'not an arrow file')
+
+    assert cache.get('key') is None
+
+
+def test_ttl(tmp_path, frame):
+    cache = QueryCache(str(tmp_path), ttl=60)
+    cache.set('old', frame)
+    cache.set('new', frame)
+
+    stamp = time.time() - 120
+    os.utime(cache._file('old'), times=(stamp, stamp))
+
+    assert cache.get('old') is None
+    assert not os.path.exists(cache._file('old'))
+    assert cache.get('new') is not None
+
+
+def test_lru_eviction(tmp_path, frame):
+    cache = QueryCache(str(tmp_path))
+    cache.set('first', frame)
+    cache.set('second', frame)
+
+    now = time.time()
+    os.utime(cache._file('first'), times=(now - 10, now))
+    os.utime(cache._file('second'), times=(now - 20, now))
+
+    # room for two entries only: the least recently used one goes
+    cache.max_size = os.path.getsize(cache._file('first')) * 2
+    cache.set('third', frame)
+
+    assert sorted(os.listdir(tmp_path)) == ['first.arrow', 'third.arrow']
+
+
+def test_keys():
+    query = {'ids' : 'ga:1', 'metrics' : 'ga:sessions'}
+
+    assert QueryCache.key('v3', query) == QueryCache.key('v3', dict(query))
+    assert QueryCache.key('v3', query) != QueryCache.key('v4', query)
+    assert QueryCache.key('v3', query, strings='category') != \
+        QueryCache.key('v3', query, strings='object')
+
+
+def test_cacheable():
+    today = pd.Timestamp('today')
+
+    assert QueryCache.cacheable('2024-01-01', '2024-02-01')
+    assert not QueryCache.cacheable('2024-01-01', today.strftime('%Y-%m-%d'))
+
+
+def test_v4_reader(tmp_path, report, transport):
+    cache = QueryCache(str(tmp_path))
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler(),
+                                  cache=cache)
+
+    df = conn.execute_query(v4_query(report))
+    calls = transport.requests
+
+    pd.testing.assert_frame_equal(conn.execute_query(v4_query(report)), df)
+    assert transport.requests == calls
+
+    # the string storage is part of the key
+    other = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler(),
+                                   cache=cache, strings='object')
+    other.execute_query(v4_query(report))
+
+    assert transport.requests == 2 * calls
+
+
+def test_v3_reader(tmp_path, report, transport):
+    cache = QueryCache(str(tmp_path))
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=unlimited_scheduler(),
+                                cache=cache)
+
+    df, res = conn.execute_query(**v3_query(report))
+    calls = transport.requests
+
+    cached, cached_res = conn.execute_query(**v3_query(report))
+
+    assert transport.requests == calls
+    pd.testing.assert_frame_equal(cached, df)
+    assert cached_res == res
+
+
+def test_current_day_is_not_cached(tmp_path, report, transport):
+    cache = QueryCache(str(tmp_path))
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler(),
+                                  cache=cache)
+    query = v4_query(report, dateRanges=[{'startDate' : '2024-01-01', 'endDate' : 'today'}])
+
+    conn.execute_query(query)
+    conn.execute_query(query)
+
+    assert transport.requests == 2 * report.pages
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,151 @@
+import json
+
+import pandas as pd
+import pytest
+
+import google2pandas._decoder as decoder
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4
+from google2pandas._decoder import DecodedRows, check_decoder, decode_v3, decode_v4
+from conftest import unlimited_scheduler, v3_query, v4_query
+
+# values the decoder has to unescape, or to leave alone
+paths = ['/', '/a "quoted" path', 'back\\slash', 'café ☃', 'tab\there', '',
+         '/' + 'x' * 300, 'line\nbreak', '\U0001f600']
+
+
+def v3_body(nrows=50):
+    return json.dumps({
+        'itemsPerPage' : nrows,
+        'totalResults' : nrows,
+        'columnHeaders' : [
+            {'name' : 'ga:pagePath', 'columnType' : 'DIMENSION', 'dataType' : 'STRING'},
+            {'name' : 'ga:sessions', 'columnType' : 'METRIC', 'dataType' : 'INTEGER'},
+            {'name' : 'ga:bounceRate', 'columnType' : 'METRIC', 'dataType' : 'PERCENT'}],
+        'rows' : [[paths[i % len(paths)], str(i), f'{i / 7:.4f}'] for i in range(nrows)]
+    }).encode()
+
+
+def v4_report(nrows=50, **kwargs):
+    report = {
+        'columnHeader' : {
+            'dimensions' : ['ga:pagePath', 'ga:source'],
+            'metricHeader' : {'metricHeaderEntries' : [
+                {'name' : 'ga:sessions', 'type' : 'INTEGER'},
+                {'name' : 'ga:avgSessionDuration', 'type' : 'TIME'}]}},
+        'data' : {
+            'rows' : [{'dimensions' : [paths[i % len(paths)], f's{i % 3}'],
+                       'metrics' : [{'values' : [str(i), f'{i * 1.5}']}]} \
+                for i in range(nrows)],
+            'rowCount' : nrows}
+    }
+    report.update(kwargs)
+
+    return report
+
+
+def v4_body(*reports):
+    return json.dumps({'reports' : list(reports or [v4_report()])}).encode()
+
+
+def test_check_decoder():
+    assert check_decoder('columns') == 'columns'
+
+    with pytest.raises(ValueError):
+        check_decoder('simdjson')
+
+    with pytest.raises(ValueError):
+        GoogleAnalyticsQueryV4(transport=object(), decoder='simdjson')
+
+
+def test_v3_matches_json():
+    body = v3_body()
+    doc = decode_v3(body)
+
+    assert isinstance(doc['rows'], DecodedRows)
+    assert len(doc['rows']) == 50
+    assert doc['totalResults'] == 50
+
+    pd.testing.assert_frame_equal(GoogleAnalyticsQuery.resp2frame(body),
+                                  GoogleAnalyticsQuery.resp2frame(json.loads(body)))
+
+
+def test_v4_matches_json():
+    body = v4_body(v4_report(), v4_report(nrows=0), v4_report(nrows=5))
+
+    assert [len(r['data']['rows']) for r in decode_v4(body)['reports']] == [50, 0, 5]
+
+    pd.testing.assert_frame_equal(GoogleAnalyticsQueryV4.resp2frame(body),
+                                  GoogleAnalyticsQueryV4.resp2frame(json.loads(body)))
+
+
+def test_wide_values(monkeypatch):
+    # the page paths take over the budget, sliced one value at a time; the
+    # metrics still fit
+    monkeypatch.setattr(decoder, 'fixed_width_budget', 2000)
+
+    assert isinstance(decode_v3(v3_body())['rows'], DecodedRows)
+    assert isinstance(decode_v4(v4_body())['reports'][0]['data']['rows'], DecodedRows)
+
+    for body, cls in ((v3_body(), GoogleAnalyticsQuery), (v4_body(), GoogleAnalyticsQueryV4)):
+        pd.testing.assert_frame_equal(cls.resp2frame(body), cls.resp2frame(json.loads(body)))
+
+
+def test_wide_metrics(monkeypatch):
+    # left to the json decoder
+    monkeypatch.setattr(decoder, 'fixed_width_budget', 64)
+
+    assert decode_v3(v3_body()) is None
+    assert decode_v4(v4_body()) is None
+
+    pd.testing.assert_frame_equal(GoogleAnalyticsQueryV4.resp2frame(v4_body()),
+                                  GoogleAnalyticsQueryV4.resp2frame(json.loads(v4_body())))
+
+
+@pytest.mark.parametrize('body', [
+    b'not json',
+    b'{"columnHeaders": [], "rows": [[1, 2]]',
+    json.dumps({'columnHeaders' : [{'name' : 'ga:sessions'}], 'rows' : [[{'v' : '1'}]]}).encode(),
+    json.dumps({'columnHeaders' : [{'name' : 'ga:sessions'}], 'rows' : [['1', '2']]}).encode()])
+def test_v3_unexpected_layouts(body):
+    assert decode_v3(body) is None
+
+
+def test_v4_unexpected_layouts():
+    # two date ranges
+    report = v4_report(nrows=3)
+    for row in report['data']['rows']:
+        row['metrics'].append({'values' : ['1', '2']})
+
+    assert decode_v4(v4_body(report)) is None
+
+    # pivots
+    report = v4_report(nrows=3)
+    for row in report['data']['rows']:
+        row['metrics'][0]['pivotValueRegions'] = [{'values' : ['1']}]
+
+    assert decode_v4(v4_body(report)) is None
+
+    # other keys in the rows
+    body = v4_body(v4_report(nrows=3)).replace(b'{"values": [', b'{"valuez": [', 1)
+    assert decode_v4(body) is None
+
+    # but every such page is still converted, by the json decoder
+    assert len(GoogleAnalyticsQueryV4.resp2frame(v4_body(report))) == 3
+
+
+@pytest.mark.parametrize('cls, query', [(GoogleAnalyticsQuery, v3_query),
+                                        (GoogleAnalyticsQueryV4, v4_query)])
+def test_readers(report, transport, cls, query):
+    frames = []
+
+    for name in ('json', 'columns'):
+        conn = cls(transport=transport, scheduler=unlimited_scheduler(), decoder=name)
+
+        if cls is GoogleAnalyticsQuery:
+            frames.append(conn.execute_query(all_results=True, **query(report))[0])
+
+        else:
+            frames.append(conn.execute_query(query(report)))
+
+    pd.testing.assert_frame_equal(*frames)
@@ -0,0 +1,158 @@
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4, IncrementalStore
+from google2pandas._incremental import backfill_range, fetch_start, merge_incremental, \
+    watermark
+from conftest import DateTransport, date_query_v3, date_query_v4, unlimited_scheduler
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IncrementalStore(str(tmp_path))
+
+
+@pytest.fixture
+def transport():
+    return DateTransport()
+
+
+@pytest.fixture
+def conn(transport):
+    return GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+
+
+def test_fetch_start():
+    assert fetch_start('2024-01-01', '2024-01-31', None) == '2024-01-01'
+    assert fetch_start('2024-01-10', '2024-01-31', '2024-01-05') == '2024-01-10'
+    assert fetch_start('2024-01-01', '2024-01-31', '2024-01-20') == '2024-01-19'
+    assert fetch_start('2024-01-01', '2024-01-31', '2024-01-20', restate=0) == '2024-01-21'
+    assert fetch_start('2024-01-01', '2024-01-31', '2024-01-31', restate=0) is None
+
+
+def test_backfill_range():
+    assert backfill_range('2024-01-01', '2024-01-31', None, '2024-01-29') is None
+    assert backfill_range('2024-01-10', '2024-01-31', '2024-01-10', '2024-01-29') is None
+    assert backfill_range('2024-01-01', '2024-01-31', '2024-01-10', '2024-01-29') == \
+        ('2024-01-01', '2024-01-09')
+
+    # the whole window is fetched anyway
+    assert backfill_range('2024-01-01', '2024-01-31', '2024-01-10', '2024-01-01') is None
+
+    # the fetched days reach back before the stored ones
+    assert backfill_range('2024-01-01', '2024-01-31', '2024-01-20', '2024-01-15') == \
+        ('2024-01-01', '2024-01-14')
+
+
+def test_merge_incremental():
+    stored = pd.DataFrame({'date' : pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+                           'sessions' : [1, 2, 3]})
+    fresh = pd.DataFrame({'date' : pd.to_datetime(['2024-01-03', '2024-01-04']),
+                          'sessions' : [30, 4]})
+
+    df = merge_incremental(stored, fresh, '2024-01-02', '2024-01-04', '2024-01-03')
+
+    assert df['sessions'].tolist() == [2, 30, 4]
+    assert watermark(df) == '2024-01-04'
+    assert watermark(None) is None
+
+
+def test_legacy_string_dates():
+    stored = pd.DataFrame({'date' : ['20240101', '20240102'], 'sessions' : [1, 2]})
+
+    assert watermark(stored) == '2024-01-02'
+
+
+def test_store(store):
+    df = pd.DataFrame({'date' : pd.to_datetime(['2024-01-01']), 'sessions' : [1]})
+
+    assert store.load_entry('key') == (None, None)
+
+    store.save('key', df, ('2024-01-01', '2024-01-31'))
+    stored, covered = store.load_entry('key')
+
+    pd.testing.assert_frame_equal(stored, df)
+    assert covered == ('2024-01-01', '2024-01-31')
+
+    store.remove('key')
+    assert store.load('key') is None
+
+
+def test_rolling_window(conn, transport, store):
+    df = conn.execute_incremental(date_query_v4('2024-03-01', '2024-03-31'), store=store)
+
+    assert transport.ranges == [('2024-03-01', '2024-03-31')]
+    assert len(df) == 62
+
+    # the window moves on: the restated and the new days only
+    transport.ranges.clear()
+    query = date_query_v4('2024-03-05', '2024-04-04')
+    df = conn.execute_incremental(query, store=store)
+
+    assert transport.ranges == [('2024-03-30', '2024-04-04')]
+    pd.testing.assert_frame_equal(df, conn.execute_query(query), check_categorical=False)
+
+
+def test_window_moved_back(conn, transport, store):
+    conn.execute_incremental(date_query_v4('2024-03-01', '2024-03-31'), store=store)
+
+    # the days before the stored range are fetched too
+    transport.ranges.clear()
+    query = date_query_v4('2024-02-01', '2024-03-31')
+    df = conn.execute_incremental(query, store=store)
+
+    assert sorted(transport.ranges) == [('2024-02-01', '2024-02-29'),
+                                        ('2024-03-30', '2024-03-31')]
+    assert len(df) == 2 * 60
+    assert df['date'].is_monotonic_increasing
+
+    pd.testing.assert_frame_equal(df, conn.execute_query(query), check_categorical=False)
+
+
+def test_legacy_entry_is_refetched(conn, transport, store):
+    query = date_query_v4('2024-03-01', '2024-03-10')
+    conn.execute_incremental(query, store=store)
+    key, = [os.path.splitext(f)[0] for f in os.listdir(store.path)]
+    stored = store.load(key)
+
+    # results stored without the range they cover
+    with open(store._file(key), 'wb') as f:
+        pickle.dump(stored.iloc[5:], f)
+
+    transport.ranges.clear()
+    df = conn.execute_incremental(query, store=store)
+
+    assert transport.ranges == [('2024-03-01', '2024-03-10')]
+    assert len(df) == 20
+
+
+def test_invalid_queries(conn, store):
+    query = date_query_v4('2024-03-01', '2024-03-10', ['source'])
+
+    with pytest.raises(ValueError):
+        conn.execute_incremental(query, store=store)
+
+    query = date_query_v4('2024-03-01', '2024-03-10')
+    query['reportRequests'] *= 2
+
+    with pytest.raises(ValueError):
+        conn.execute_incremental(query, store=store)
+
+
+def test_v3(transport, store):
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=unlimited_scheduler())
+
+    conn.execute_incremental(store=store, **date_query_v3('2024-03-01', '2024-03-31'))
+
+    transport.ranges.clear()
+    query = date_query_v3('2024-02-20', '2024-04-02')
+    df, _ = conn.execute_incremental(store=store, **query)
+
+    assert sorted(transport.ranges) == [('2024-02-20', '2024-02-29'),
+                                        ('2024-03-30', '2024-04-02')]
+
+    full, _ = conn.execute_query(all_results=True, **query)
+    pd.testing.assert_frame_equal(df, full, check_categorical=False)
@@ -0,0 +1,24 @@
+import pytest
+
+from google2pandas import QueryParser
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ('columnHeaders,rows,nextLink', 'columnHeaders,rows,nextLink'),
+    (['reports/columnHeader', 'reports/data(rows,rowCount)'],
+     'reports/columnHeader,reports/data(rows,rowCount)'),
+    ('rows, query/start-date', 'rows,query/start-date'),
+    ('query(start-date,end-date),rows', 'query(start-date,end-date),rows'),
+    ('reports/*', 'reports/*')
+])
+def test_check_fields_valid(fields, expected):
+    assert QueryParser.check_fields(fields) == expected
+
+
+@pytest.mark.parametrize('fields', [
+    '', 'rows,', ',rows', 'rows//x', 'reports(rows', 'reports)rows(', 'a()',
+    'rows;x', 'reports(rows)x', 42
+])
+def test_check_fields_invalid(fields):
+    with pytest.raises(ValueError, match='Malformed / invalid fields selector'):
+        QueryParser.check_fields(fields)
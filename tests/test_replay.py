@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4, \
+    RecordingTransport, ReplayTransport
+from google2pandas._panalysis_ga import default_secrets_v4
+from google2pandas._replay import _shift_dates
+from google2pandas._scheduler import shared_scheduler
+from conftest import unlimited_scheduler, v3_query, v4_query
+
+
+def age(path, days):
+    '''
+    Rewrite an archive as if it had been recorded days earlier, with the
+    dates of the requests resolved on that day
+    '''
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header, *entries = [json.loads(line) for line in f]
+
+    header['created'] -= days * 86400
+    for entry in entries:
+        entry['key'] = _shift_dates(entry['key'], -days)
+
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(e) + '\n' for e in [header] + entries))
+
+
+def test_shift_dates():
+    assert _shift_dates('start-date=2024-03-01&end-date=2024-12-31', 1) == \
+        'start-date=2024-03-02&end-date=2025-01-01'
+    assert _shift_dates(b'{"startDate": "2024-03-01"}', -1) == b'{"startDate": "2024-02-29"}'
+
+    # neither invalid dates nor longer digit runs
+    assert _shift_dates('2024-02-30 12024-01-01', 1) == '2024-02-30 12024-01-01'
+    assert _shift_dates(None, 1) is None
+
+
+def test_v4_round_trip(tmp_path, report, transport):
+    path = str(tmp_path / 'v4.g2p')
+
+    with RecordingTransport(transport, path) as recorder:
+        df = GoogleAnalyticsQueryV4(transport=recorder, scheduler=unlimited_scheduler())\
+            .execute_query(v4_query(report))
+
+    replay = ReplayTransport(path, latency='zero')
+    conn = GoogleAnalyticsQueryV4(transport=replay)
+
+    # twice: the recorded responses are repeated once used up
+    for _ in range(2):
+        pd.testing.assert_frame_equal(conn.execute_query(v4_query(report)), df)
+
+    assert replay.requests == 2 * report.pages
+
+
+def test_v3_round_trip(tmp_path, report, transport):
+    path = str(tmp_path / 'v3.g2p')
+
+    with RecordingTransport(transport, path) as recorder:
+        conn = GoogleAnalyticsQuery(transport=recorder, scheduler=unlimited_scheduler())
+        df, res = conn.execute_query(all_results=True, **v3_query(report))
+
+    assert recorder.requests == report.pages
+
+    conn = GoogleAnalyticsQuery(transport=ReplayTransport(path, latency='zero'))
+    replayed, replayed_res = conn.execute_query(all_results=True, **v3_query(report))
+
+    pd.testing.assert_frame_equal(replayed, df)
+    assert replayed_res == res
+
+
+def test_relative_dates(tmp_path, report, transport):
+    path = str(tmp_path / 'relative.g2p')
+    query = v3_query(report, start_date='30daysAgo', end_date='yesterday')
+
+    with RecordingTransport(transport, path) as recorder:
+        df, _ = GoogleAnalyticsQuery(transport=recorder, scheduler=unlimited_scheduler())\
+            .execute_query(all_results=True, **query)
+
+    # replayed three days after the recording
+    age(path, 3)
+
+    conn = GoogleAnalyticsQuery(transport=ReplayTransport(path, latency='zero'))
+    replayed, _ = conn.execute_query(all_results=True, **query)
+
+    pd.testing.assert_frame_equal(replayed, df)
+
+    with pytest.raises(ValueError, match='moved back 3 days'):
+        conn.execute_query(**dict(query, start_date='2020-01-01'))
+
+
+def test_missing_response(tmp_path, report, transport):
+    path = str(tmp_path / 'missing.g2p')
+
+    with RecordingTransport(transport, path) as recorder:
+        GoogleAnalyticsQueryV4(transport=recorder, scheduler=unlimited_scheduler())\
+            .execute_query(v4_query(report))
+
+    conn = GoogleAnalyticsQueryV4(transport=ReplayTransport(path, latency='zero'))
+
+    with pytest.raises(ValueError, match='No recorded response'):
+        conn.execute_query(v4_query(report, pageSize=10))
+
+
+def test_invalid_archives(tmp_path):
+    path = str(tmp_path / 'future.g2p')
+
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'version' : 99, 'created' : 0}) + '\n')
+
+    with pytest.raises(ValueError):
+        ReplayTransport(path)
+
+    with pytest.raises(ValueError):
+        ReplayTransport(path, latency='slow')
+
+
+def test_replay_is_not_paced(tmp_path, report, transport):
+    path = str(tmp_path / 'sched.g2p')
+
+    with RecordingTransport(transport, path) as recorder:
+        GoogleAnalyticsQueryV4(transport=recorder, scheduler=unlimited_scheduler())\
+            .execute_query(v4_query(report))
+
+    shared = shared_scheduler(os.path.abspath(default_secrets_v4), 'v4')
+    used = shared._daily.used()
+
+    conn = GoogleAnalyticsQueryV4(transport=ReplayTransport(path, latency='zero'))
+    conn.execute_query(v4_query(report))
+
+    assert conn._scheduler is not shared
+    assert shared._daily.used() == used
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4
+from google2pandas._sharding import date_shards, merge_shards
+from conftest import DateTransport, date_query_v3, date_query_v4, unlimited_scheduler
+
+
+def test_month_shards():
+    assert date_shards('2024-01-15', '2024-03-10') == [
+        ('2024-01-15', '2024-01-31'),
+        ('2024-02-01', '2024-02-29'),
+        ('2024-03-01', '2024-03-10')]
+
+
+def test_week_and_day_shards():
+    # weeks end on Sunday
+    assert date_shards('2024-01-03', '2024-01-10', 'week') == [
+        ('2024-01-03', '2024-01-07'),
+        ('2024-01-08', '2024-01-10')]
+
+    assert date_shards('2024-01-30', '2024-02-01', 'day') == [
+        ('2024-01-30', '2024-01-30'),
+        ('2024-01-31', '2024-01-31'),
+        ('2024-02-01', '2024-02-01')]
+
+    assert date_shards('2024-01-05', '2024-01-05') == [('2024-01-05', '2024-01-05')]
+
+
+def test_invalid_freq():
+    with pytest.raises(ValueError):
+        date_shards('2024-01-01', '2024-02-01', 'year')
+
+
+def test_merge_shards():
+    frames = [pd.DataFrame({'source' : ['a', 'b'], 'sessions' : [1, 2], 'bounceRate' : [.5, .1]}),
+              pd.DataFrame({'source' : ['b', 'c'], 'sessions' : [3, 4], 'bounceRate' : [.2, .3]})]
+
+    df = merge_shards(frames, ['source'])
+    assert df['sessions'].tolist() == [1, 2, 3, 4]
+    assert df.index.tolist() == [0, 1, 2, 3]
+
+    df = merge_shards(frames, ['source'], aggregate=['ga:sessions'])
+    assert df.to_dict('list') == {'source' : ['a', 'b', 'c'], 'sessions' : [1, 5, 4]}
+
+    df = merge_shards(frames, [], aggregate=['sessions'])
+    assert df['sessions'].tolist() == [10]
+
+
+def test_v3_sharded_equals_query():
+    transport = DateTransport()
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=unlimited_scheduler())
+    query = date_query_v3('2024-01-20', '2024-03-05')
+
+    df, _ = conn.execute_query(all_results=True, **query)
+    sharded, results = conn.execute_sharded(freq='month', workers=3, **query)
+
+    assert len(results) == 3
+    assert sorted(transport.ranges[1:]) == [
+        ('2024-01-20', '2024-01-31'),
+        ('2024-02-01', '2024-02-29'),
+        ('2024-03-01', '2024-03-05')]
+
+    pd.testing.assert_frame_equal(sharded, df, check_categorical=False)
+
+
+def test_v4_sharded_equals_query():
+    transport = DateTransport()
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+    query = date_query_v4('2024-01-20', '2024-02-10')
+
+    df = conn.execute_query(query)
+    sharded = conn.execute_sharded(query, freq='week', workers=3)
+
+    assert len(transport.ranges) == 1 + 4
+
+    pd.testing.assert_frame_equal(sharded, df, check_categorical=False)
+
+    # the rows of each source, split over the shards, are summed back
+    query = date_query_v4('2024-01-20', '2024-02-10', ['source'])
+    totals = conn.execute_sharded(query, aggregate=True)
+
+    pd.testing.assert_frame_equal(totals, conn.execute_query(query),
+                                  check_categorical=False)
+
+
+def test_v4_requires_date_ranges():
+    conn = GoogleAnalyticsQueryV4(transport=DateTransport(), scheduler=unlimited_scheduler())
+    query = date_query_v4('2024-01-01', '2024-01-31')
+    del query['reportRequests'][0]['dateRanges']
+
+    with pytest.raises(ValueError):
+        conn.execute_sharded(query)
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4
+from google2pandas._sinks import FrameWriter
+from conftest import unlimited_scheduler, v3_query, v4_query
+
+
+def read(path, format):
+    if format == 'parquet':
+        return pd.read_parquet(path)
+
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def assert_same(written, df):
+    # categoricals may come back as plain strings, or with other categories
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            written[col] = written[col].astype(object)
+            df = df.assign(**{col : df[col].astype(object)})
+
+    pd.testing.assert_frame_equal(written, df, check_dtype=False)
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_frame_writer(tmp_path, format):
+    path = str(tmp_path / 'out' / f'pages.{format}')
+    pages = [pd.DataFrame({'source' : pd.Categorical([]), 'sessions' : pd.array([], 'UInt32')}),
+             pd.DataFrame({'source' : pd.Categorical(['a', 'b']),
+                           'sessions' : pd.array([1, 2], 'UInt32')}),
+             pd.DataFrame({'source' : pd.Categorical(['c', None, 'a']),
+                           'sessions' : pd.array([3, None, 5], 'UInt32')})]
+
+    with FrameWriter(path, format) as sink:
+        for df in pages:
+            sink.write(df)
+
+    assert sink.rows == 5
+
+    df = read(path, format)
+    assert df['source'].isna().tolist() == [False, False, False, True, False]
+    assert df['source'].dropna().astype(str).tolist() == ['a', 'b', 'c', 'a']
+    assert df['sessions'].isna().tolist() == [False, False, False, True, False]
+    assert df['sessions'].dropna().tolist() == [1, 2, 3, 5]
+
+
+def test_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        FrameWriter(str(tmp_path / 'out.csv'), 'csv')
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_v4_export(tmp_path, report, transport, format):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+    path = str(tmp_path / f'v4.{format}')
+
+    rows = conn.execute_query_to(v4_query(report), path, format)
+
+    assert rows == report.rows
+    assert_same(read(path, format), conn.execute_query(v4_query(report)))
+
+
+def test_v4_export_single_request(tmp_path, report, transport):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+    query = v4_query(report)
+
+    with pytest.raises(ValueError):
+        conn.execute_query_to({'reportRequests' : query['reportRequests'] * 2},
+                              str(tmp_path / 'out.parquet'))
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_v3_export(tmp_path, report, transport, workers):
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=unlimited_scheduler())
+    path = str(tmp_path / 'v3.parquet')
+
+    rows = conn.execute_query_to(path, workers=workers, **v3_query(report))
+    df, _ = conn.execute_query(all_results=True, **v3_query(report))
+
+    assert rows == report.rows
+    assert pq.ParquetFile(path).num_row_groups == report.pages
+    assert_same(read(path, 'parquet'), df)
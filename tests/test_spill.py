@@ -0,0 +1,97 @@
+import gc
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from google2pandas import GoogleAnalyticsQuery, GoogleAnalyticsQueryV4, SpilledFrame
+from google2pandas._spill import parse_size
+from conftest import unlimited_scheduler, v3_query, v4_query
+
+
+@pytest.mark.parametrize('size, expected', [
+    (1000, 1000), (1e6, 10**6), ('512', 512), (' 1.5 mb', 1500000),
+    ('2GiB', 2 * 2**30), ('64KiB', 65536)])
+def test_parse_size(size, expected):
+    assert parse_size(size) == expected
+
+
+@pytest.mark.parametrize('size', ['x', '-1MB', 0, '3TB', ''])
+def test_invalid_sizes(size):
+    with pytest.raises(ValueError):
+        parse_size(size)
+
+
+@pytest.mark.parametrize('decoder', ['json', 'columns'])
+def test_v4_spills(report, transport, decoder):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler(),
+                                  decoder=decoder)
+    df = conn.execute_query(v4_query(report))
+
+    # a page is well over 1KB: every page goes to disk
+    spilled = conn.execute_query(v4_query(report), memory_limit='1KB')
+
+    assert isinstance(spilled, SpilledFrame)
+    assert len(spilled) == report.rows
+    assert spilled.columns == list(df.columns)
+
+    pd.testing.assert_frame_equal(spilled.to_pandas(), df, check_categorical=False)
+    pd.testing.assert_frame_equal(spilled.to_pandas(columns=df.columns[:2]),
+                                  df[df.columns[:2]], check_categorical=False)
+
+    frames = list(spilled.iter_frames())
+    assert len(frames) > 1
+    assert sum(len(f) for f in frames) == report.rows
+
+    path = spilled.path
+    del spilled, frames
+    gc.collect()
+
+    assert not os.path.exists(path)
+
+
+def test_under_the_limit(report, transport):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+
+    df = conn.execute_query(v4_query(report), memory_limit='1GB')
+
+    assert isinstance(df, pd.DataFrame)
+    pd.testing.assert_frame_equal(df, conn.execute_query(v4_query(report)))
+
+
+def test_v3_spills(report, transport):
+    conn = GoogleAnalyticsQuery(transport=transport, scheduler=unlimited_scheduler())
+    df, _ = conn.execute_query(all_results=True, **v3_query(report))
+
+    with conn.execute_query(all_results=True, memory_limit=1024,
+                            **v3_query(report))[0] as spilled:
+        pd.testing.assert_frame_equal(spilled.to_pandas(), df, check_categorical=False)
+
+    assert not os.path.exists(spilled.path)
+
+
+def test_invalid_options(report, transport):
+    conn = GoogleAnalyticsQueryV4(transport=transport, scheduler=unlimited_scheduler())
+    query = v4_query(report)
+
+    with pytest.raises(ValueError):
+        conn.execute_query(query, as_dict=True, memory_limit='1MB')
+
+    with pytest.raises(ValueError):
+        conn.execute_query(query, all_results=False, memory_limit='1MB')
+
+    with pytest.raises(ValueError):
+        conn.execute_query({'reportRequests' : query['reportRequests'] * 2},
+                           memory_limit='1MB')
+
+    with pytest.raises(ValueError):
+        conn.execute_query(query, memory_limit='lots')
+
+    v3 = GoogleAnalyticsQuery(transport=transport, scheduler=unlimited_scheduler())
+
+    with pytest.raises(ValueError):
+        v3.execute_query(as_dict=True, memory_limit='1MB', **v3_query(report))
+
+    assert transport.requests == 0